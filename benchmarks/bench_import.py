@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Measures the time to import :mod:`ycsettings` using ``python -X importtime``, and checks that heavy dependencies are only imported when they are used.
+Exits with a non-zero status if a heavy dependency is imported eagerly, or if the import takes longer than ``--max-ms``.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_import.py --max-ms 50
+"""
+
+from argparse import ArgumentParser
+import os
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ['uriutils', 'yaml', 'pickle', 'configparser', 'tempfile', 'multiprocessing', 'concurrent.futures', 'urllib.request', 'requests', 'boto3', 'google.cloud']
+
+CHECK_CODE = 'import sys; import ycsettings; print(",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES)
+
+
+def import_time(repeat):
+    """Returns the best cumulative import time of :mod:`ycsettings` in microseconds."""
+
+    best = None
+    for _ in range(repeat):
+        # -S skips site, which may import modules (i.e., tempfile) on its own
+        stderr = subprocess.run([sys.executable, '-S', '-X', 'importtime', '-c', 'import ycsettings'], stderr=subprocess.PIPE, check=True, universal_newlines=True).stderr
+        for line in stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == 'ycsettings':
+                t = int(fields[1])
+                best = t if best is None else min(best, t)
+            #end if
+        #end for
+    #end for
+
+    return best
+#end def
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the import time of ycsettings.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of repetitions; the best time is reported.')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if importing takes longer than this.')
+    A = parser.parse_args()
+
+    # compile first, so that we do not measure the compilation of modules when bytecode is not written (i.e., PYTHONDONTWRITEBYTECODE)
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'ycsettings')], check=True)
+
+    elapsed_ms = import_time(A.repeat) / 1000.0
+    print('import ycsettings took {:.2f} ms.'.format(elapsed_ms))
+
+    eager_modules = subprocess.run([sys.executable, '-S', '-c', CHECK_CODE], stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout.strip()
+    failed = False
+    if eager_modules:
+        print('Heavy modules imported eagerly: {}'.format(eager_modules))
+        failed = True
+    #end if
+
+    if A.max_ms is not None and elapsed_ms > A.max_ms:
+        print('Import time exceeds {:.2f} ms.'.format(A.max_ms))
+        failed = True
+    #end if
+
+    sys.exit(1 if failed else 0)
+#end def
+
+
+if __name__ == '__main__': main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Measures :meth:`ycsettings.Settings.get` throughput on a :class:`~ycsettings.Settings` object stacked from the environment and several large YAML and JSON files.
+
+Usage::
+
+    python benchmarks/bench_lookup.py --n-files 4 --n-keys 5000
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import random
+from tempfile import TemporaryDirectory
+import time
+
+import yaml
+
+from ycsettings import Settings
+
+
+def make_sources(dirname, n_files, n_keys):
+    sources = []
+    for i in range(n_files):
+        d = dict(('file{}_key{}'.format(i, j), j) for j in range(n_keys))
+        if i % 2 == 0:
+            fname = os.path.join(dirname, 'settings{}.yaml'.format(i))
+            with open(fname, 'w') as f: yaml.dump(d, f, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+        else:
+            fname = os.path.join(dirname, 'settings{}.json'.format(i))
+            with open(fname, 'w') as f: json.dump(d, f)
+        #end if
+
+        sources.append(fname)
+    #end for
+
+    return sources
+#end def
+
+
+def bench(name, func, keys, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for k in keys: func(k)
+    elapsed = time.perf_counter() - start_time
+    n = repeat * len(keys)
+    print('{:<40s} {:>14,.0f} lookups/sec'.format(name, n / elapsed))
+#end def
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark Settings.get lookups.')
+    parser.add_argument('--n-files', type=int, default=4, help='Number of YAML/JSON files to stack.')
+    parser.add_argument('--n-keys', type=int, default=5000, help='Number of keys per file.')
+    parser.add_argument('--n-lookups', type=int, default=2000, help='Number of distinct keys to look up.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of passes over the looked up keys.')
+    A = parser.parse_args()
+
+    with TemporaryDirectory() as dirname:
+        sources = make_sources(dirname, A.n_files, A.n_keys)
+        start_time = time.perf_counter()
+        settings = Settings(*sources)
+        print('Loaded {} sources ({} environment variables) in {:.3f}s.'.format(len(sources) + 1, len(os.environ), time.perf_counter() - start_time))
+        frozen_settings = Settings(*sources, frozen=True)
+    #end with
+
+    random.seed(0)
+    keys = ['FILE{}_KEY{}'.format(random.randrange(A.n_files), random.randrange(A.n_keys)) for _ in range(A.n_lookups)]
+    missing_keys = ['missing_key{}'.format(i) for i in range(A.n_lookups)]
+
+    bench('uncached hits (case insensitive)', lambda k: settings.get(k, use_cache=False), keys, A.repeat)
+    bench('uncached misses (case insensitive)', lambda k: settings.get(k, use_cache=False), missing_keys, A.repeat)
+    bench('uncached hits (case sensitive)', lambda k: settings.get(k.lower(), use_cache=False, case_sensitive=True), keys, A.repeat)
+    bench('cached hits', settings.get, keys, A.repeat)
+    bench('cached misses', settings.get, missing_keys, A.repeat)
+    bench('frozen hits', frozen_settings.get, keys, A.repeat)
+    bench('frozen misses', frozen_settings.get, missing_keys, A.repeat)
+#end def
+
+
+if __name__ == '__main__': main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Compares the parse time of settings files per format, backend, and file size.
+
+Usage::
+
+    python benchmarks/bench_parsers.py --sizes 100 10000 100000
+"""
+
+from argparse import ArgumentParser
+import json
+import time
+
+import yaml
+
+from ycsettings import parsers
+
+
+def make_settings(n_keys):
+    return dict(('key{}'.format(i), dict(name='value{}'.format(i), weight=i * 0.5, enabled=i % 2 == 0, tags=['a', 'b', str(i)])) for i in range(n_keys))
+
+
+def bench(loads, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        loads(content)
+        best = min(best, time.perf_counter() - start_time)
+    #end for
+
+    return best
+#end def
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the settings parser backends.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000], help='Number of top level keys in the generated settings files.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of repetitions; the best time is reported.')
+    A = parser.parse_args()
+
+    print('{:<6s} {:<8s} {:>10s} {:>12s} {:>10s}'.format('format', 'backend', 'keys', 'bytes', 'seconds'))
+    for n_keys in A.sizes:
+        d = make_settings(n_keys)
+        contents = dict(json=json.dumps(d).encode('utf-8'), yaml=yaml.dump(d, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper)).encode('utf-8'))
+
+        for fmt, content in sorted(contents.items()):
+            for backend in parsers.available_backends(fmt):
+                parsers.set_backend(fmt, backend)
+                elapsed = bench(parsers.json_loads if fmt == 'json' else parsers.yaml_load, content, A.repeat)
+                print('{:<6s} {:<8s} {:>10,d} {:>12,d} {:>10.4f}'.format(fmt, backend, n_keys, len(content), elapsed))
+            #end for
+
+            parsers.set_backend(fmt)
+        #end for
+    #end for
+#end def
+
+
+if __name__ == '__main__': main()
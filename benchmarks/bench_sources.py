@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Compares the time to resolve string sources with and without probing for Python modules, on a large :data:`sys.path`.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_sources.py --path-entries 500
+"""
+
+from argparse import ArgumentParser
+import importlib.util
+import os
+import sys
+from tempfile import TemporaryDirectory
+import time
+
+import yaml
+
+from ycsettings import Settings
+from ycsettings.settings import _classify_string_source
+
+
+def bench(func, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat): func()
+
+    return (time.perf_counter() - start_time) / repeat
+#end def
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the resolution of string settings sources.')
+    parser.add_argument('--path-entries', type=int, default=500, help='Number of (empty) directories to prepend to sys.path.')
+    parser.add_argument('--repeat', type=int, default=200, help='Number of repetitions.')
+    A = parser.parse_args()
+
+    with TemporaryDirectory() as dirname:
+        path_dirs = [os.path.join(dirname, 'path{}'.format(i)) for i in range(A.path_entries)]
+        for path_dir in path_dirs: os.makedirs(path_dir)
+        sys.path[:0] = path_dirs
+
+        settings_file = os.path.join(dirname, 'settings.yaml')
+        with open(settings_file, 'w') as f: yaml.dump(dict(('key{}'.format(i), i) for i in range(10)), f)
+
+        sources = [settings_file, 's3://bucket/settings.json', 'settings.yaml']
+        print('sys.path has {:,d} entries.'.format(len(sys.path)))
+        print('{:<40s} {:>16s} {:>16s}'.format('source', 'find_spec (ms)', 'classify (ms)'))
+        for source in sources:
+            def _find_spec():
+                try: importlib.util.find_spec(source)
+                except (AttributeError, ImportError): pass
+            #end def
+
+            def _classify():
+                _classify_string_source(source)
+
+            print('{:<40s} {:>16.4f} {:>16.4f}'.format(source[-40:], bench(_find_spec, A.repeat) * 1000.0, bench(_classify, A.repeat) * 1000.0))
+        #end for
+
+        print('Settings({}) took {:.4f} ms.'.format(os.path.basename(settings_file), bench(lambda: Settings(settings_file, search_first=[]), A.repeat) * 1000.0))
+    #end with
+#end def
+
+
+if __name__ == '__main__': main()
@@ -24,6 +24,7 @@ setup(
     url='https://github.com/skylander86/ycsettings',
     packages=find_packages(include=['ycsettings']),
     install_requires=requirements,
+    entry_points={'console_scripts': ['ycsettings=ycsettings.__main__:main']},
     license="Apache Software License 2.0",
     zip_safe=True,
     keywords='ycsettings',
@@ -0,0 +1,66 @@
+"""
+Command line utilities for ycsettings.
+
+Usage::
+
+    ycsettings compile settings.yaml -o settings.ycs
+    ycsettings profile settings.yaml myapp.settings s3://bucket/settings.json
+"""
+
+from argparse import ArgumentParser
+import logging
+import time
+
+from . import ycs
+from .metrics import format_source_traces
+from .settings import Settings
+
+
+def compile_settings(A):
+    settings = Settings(*A.sources, search_first=[], case_sensitive=True)
+    d = dict((k, settings.get(k)) for k in settings)
+    ycs.dump(d, A.output)
+
+    print('Compiled {} settings into <{}>.'.format(len(d), A.output))
+#end def
+
+
+def profile_settings(A):
+    search_first = [] if A.no_env else ['env', 'env_settings_uri']
+    start_time = time.perf_counter()
+    settings = Settings(*A.sources, search_first=search_first, trace=True, cache_dir=A.cache_dir, stream=A.stream, prefetch=A.prefetch)
+    elapsed = time.perf_counter() - start_time
+
+    print(format_source_traces(settings.source_traces))
+    print('Settings() took {:.2f} ms.'.format(elapsed * 1000.0))
+#end def
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='ycsettings', description='ycsettings command line utilities.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show debug log messages.')
+    subparsers = parser.add_subparsers(dest='command', metavar='<command>')
+    subparsers.required = True
+
+    compile_parser = subparsers.add_parser('compile', help='Compile settings into a memory mappable .ycs file.')
+    compile_parser.add_argument('sources', type=str, nargs='+', metavar='<source>', help='Settings files, URIs, or Python modules, in order of priority.')
+    compile_parser.add_argument('-o', '--output', type=str, required=True, metavar='<output>', help='Path of the .ycs file to write.')
+    compile_parser.set_defaults(func=compile_settings)
+
+    profile_parser = subparsers.add_parser('profile', help='Load settings and print how long each source took to resolve, read, and parse.')
+    profile_parser.add_argument('sources', type=str, nargs='*', metavar='<source>', help='Settings files, URIs, or Python modules, in order of priority.')
+    profile_parser.add_argument('--no-env', action='store_true', help='Do not load the environment and SETTINGS_URI first.')
+    profile_parser.add_argument('--cache-dir', type=str, default=None, metavar='<dir>', help='Use this directory to cache parsed sources.')
+    profile_parser.add_argument('--stream', action='store_true', help='Index large JSON and YAML files instead of parsing them.')
+    profile_parser.add_argument('--prefetch', action='store_true', help='Fetch remote sources concurrently.')
+    profile_parser.set_defaults(func=profile_settings)
+
+    A = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)-15s [%(name)s-%(process)d] %(levelname)s: %(message)s', level=logging.DEBUG if A.verbose else logging.WARNING)
+
+    A.func(A)
+#end def
+
+
+if __name__ == '__main__': main()
@@ -0,0 +1,175 @@
+"""
+This module contains the on-disk cache of parsed settings sources.
+Parsed settings are stored as pickles and validated against the fingerprint of the source, i.e., ``(path, size, mtime)`` for local files and ``ETag``/``Last-Modified`` for remote URIs.
+"""
+
+__all__ = ['SourceCache', 'conditional_get', 'source_fingerprint']
+
+
+import logging
+import os
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+def source_fingerprint(uri, timeout=10):
+    """
+    Computes a fingerprint of the content at ``uri`` without reading it.
+    For local files, it is based on ``(path, size, mtime)``; for HTTP(S) URIs, it makes a ``HEAD`` request for the ``ETag`` and ``Last-Modified`` headers; for S3 and Google Cloud Storage, it uses the object's ETag and last modified time.
+
+    :param str uri: file path or URI of the source
+    :param float timeout: timeout in seconds for remote requests
+    :returns: a hashable fingerprint, or ``None`` if the source cannot be fingerprinted
+    """
+
+    o = urlparse(uri)
+    if o.scheme in ('', 'file') or len(o.scheme) == 1:  # single letter schemes are Windows drives
+        path = os.path.abspath(o.path if o.scheme == 'file' else uri)
+        try: st = os.stat(path)
+        except OSError: return None
+
+        return ('file', path, st.st_size, st.st_mtime_ns)
+    #end if
+
+    try:
+        if o.scheme in ('http', 'https'):
+            from urllib.request import Request, urlopen
+
+            with urlopen(Request(uri, method='HEAD'), timeout=timeout) as r:
+                return _http_fingerprint(uri, r.headers)
+
+        else:
+            from uriutils import get_uri_obj
+
+            uri_obj = get_uri_obj(uri)
+            if hasattr(uri_obj, 's3_object'):
+                uri_obj.s3_object.load()
+                etag, last_modified = uri_obj.s3_object.e_tag, uri_obj.s3_object.last_modified
+            elif hasattr(uri_obj, 'blob'):
+                uri_obj.blob.reload()
+                etag, last_modified = uri_obj.blob.etag, uri_obj.blob.updated
+            else: return None
+        #end if
+
+    except Exception as e:
+        logger.debug('Unable to fingerprint <{}>: {}'.format(uri, e))
+        return None
+    #end try
+
+    if etag is None and last_modified is None: return None
+
+    return (o.scheme, uri, etag, str(last_modified))
+#end def
+
+
+def _http_fingerprint(uri, headers):
+    etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+    if etag is None and last_modified is None: return None
+
+    return (urlparse(uri).scheme, uri, etag, str(last_modified))
+#end def
+
+
+def conditional_get(uri, fingerprint=None, timeout=10):
+    """
+    Downloads the content at the HTTP(S) ``uri``, unless it did not change since ``fingerprint`` was taken.
+    The ``ETag`` and ``Last-Modified`` of ``fingerprint`` are sent as ``If-None-Match`` and ``If-Modified-Since`` headers, so that the server can answer ``304 Not Modified`` without a body.
+
+    :param str uri: HTTP(S) URI of the source
+    :param tuple fingerprint: fingerprint returned by :func:`source_fingerprint` or by a previous call, or ``None`` to download unconditionally
+    :param float timeout: timeout in seconds
+    :returns: a tuple of the new fingerprint (``None`` if the response has neither header) and the content, which is ``None`` if the source is not modified
+    :rtype: tuple
+    """
+
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    headers = {}
+    if fingerprint is not None and fingerprint[0] in ('http', 'https'):
+        _, _, etag, last_modified = fingerprint
+        if etag is not None: headers['If-None-Match'] = etag
+        if last_modified != 'None': headers['If-Modified-Since'] = last_modified
+    #end if
+
+    try:
+        with urlopen(Request(uri, headers=headers), timeout=timeout) as r:
+            return _http_fingerprint(uri, r.headers), r.read()
+
+    except HTTPError as e:
+        if e.code == 304: return fingerprint, None
+        raise
+    #end try
+#end def
+
+
+class SourceCache(object):
+    """
+    A directory of parsed settings, one pickle per source, that are reused as long as the fingerprint of the source is unchanged.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param str cache_dir: directory to store the parsed settings in; it is created if necessary
+        """
+
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    #end def
+
+    def _cache_path(self, uri):
+        import hashlib
+
+        return os.path.join(self.cache_dir, hashlib.sha1(uri.encode('utf-8')).hexdigest() + '.pkl')
+    #end def
+
+    def get(self, uri, fingerprint):
+        """
+        :returns: the cached settings of ``uri`` if they were stored with the same ``fingerprint``, otherwise ``None``
+        :rtype: dict
+        """
+
+        import pickle
+
+        try:
+            with open(self._cache_path(uri), 'rb') as f:
+                cached_fingerprint, settings = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError): return None
+
+        if cached_fingerprint != fingerprint: return None
+
+        return settings
+    #end def
+
+    def put(self, uri, fingerprint, settings):
+        """
+        Stores the parsed ``settings`` of ``uri`` with its ``fingerprint``.
+        The cache file is replaced atomically so that concurrent processes never read a partially written file; settings that cannot be pickled are not cached.
+        """
+
+        import pickle
+        from tempfile import NamedTemporaryFile
+
+        try: data = pickle.dumps((fingerprint, settings), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug('Unable to cache settings of <{}>: {}'.format(uri, e))
+            return
+        #end try
+
+        temp_fname = None
+        try:
+            with NamedTemporaryFile(mode='wb', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+                temp_fname = f.name
+                f.write(data)
+            #end with
+
+            os.replace(temp_fname, self._cache_path(uri))
+
+        except OSError as e:
+            logger.warning('Unable to write settings cache for <{}>: {}'.format(uri, e))
+            if temp_fname and os.path.exists(temp_fname): os.remove(temp_fname)
+        #end try
+    #end def
+#end class
@@ -0,0 +1,200 @@
+"""
+This module contains the optional instrumentation of :class:`Settings` lookups and source loading.
+
+Pass ``metrics=True`` (or a :class:`SettingsMetrics` object) to :class:`Settings` to count cache hits and misses, the sources that answered each key, the number of sources walked, the time spent in cast functions, and the time spent loading each source.
+When metrics are disabled (the default), lookups only pay for a single ``None`` check.
+
+.. code-block:: python
+
+    settings = Settings('settings.yaml', metrics=True)
+    ...
+    print(settings.metrics.hot_keys(10))
+    print(settings.metrics.report()['sources'])
+
+Pass ``trace=True`` to :class:`Settings` to record a :class:`SourceTrace` of how each source was loaded during construction in :attr:`Settings.source_traces`; ``ycsettings profile`` prints them as a table (see :func:`format_source_traces`).
+"""
+
+__all__ = ['SettingsMetrics', 'SourceTrace', 'format_source_traces']
+
+
+from collections import Counter, OrderedDict
+from threading import Lock
+
+
+class SettingsMetrics(object):
+    """
+    Counters and timings of the lookups of a :class:`Settings` object.
+    Recording is thread-safe; every event is also passed to ``callback`` (if any) as a :func:`dict` with a ``type`` of ``lookup``, ``cast``, or ``load``.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param func callback: function called with every recorded event, i.e., to forward events to a metrics system
+        """
+
+        self.callback = callback
+        self._lock = Lock()
+        self.reset()
+    #end def
+
+    def reset(self):
+        """Clears all counters and timings, except for source load times."""
+
+        with self._lock:
+            self.lookups = Counter()
+            self.cache_hits = Counter()
+            self.cast_cache_hits = Counter()
+            self.casts = Counter()
+            self.cast_time = Counter()
+            self.sources_walked = 0
+            self.answered_by = OrderedDict()  # key -> name of the source that answered its last uncached lookup
+            self.source_answers = Counter()
+            if not hasattr(self, 'load_times'): self.load_times = OrderedDict()
+        #end with
+    #end def
+
+    def record_lookup(self, key, cache_hit, source=None, sources_walked=0):
+        """
+        Records a lookup of ``key``.
+
+        :param bool cache_hit: whether the raw value was found in the cache (or the frozen table)
+        :param source: name of the source that answered the lookup, or ``None`` if the key is missing
+        :param int sources_walked: number of sources searched for an uncached lookup
+        """
+
+        with self._lock:
+            self.lookups[key] += 1
+            if cache_hit: self.cache_hits[key] += 1
+            else:
+                self.sources_walked += sources_walked
+                self.answered_by[key] = source
+                if source is not None: self.source_answers[source] += 1
+            #end if
+        #end with
+
+        if self.callback is not None: self.callback(dict(type='lookup', key=key, cache_hit=cache_hit, source=source, sources_walked=sources_walked))
+    #end def
+
+    def record_cast(self, key, seconds, cache_hit=False):
+        """Records a cast of the value of ``key`` that took ``seconds``, or a hit of the casted values cache."""
+
+        with self._lock:
+            if cache_hit: self.cast_cache_hits[key] += 1
+            else:
+                self.casts[key] += 1
+                self.cast_time[key] += seconds
+            #end if
+        #end with
+
+        if self.callback is not None: self.callback(dict(type='cast', key=key, cache_hit=cache_hit, seconds=seconds))
+    #end def
+
+    def record_load(self, source, seconds, n_keys):
+        """Records that loading ``source`` took ``seconds`` and yielded ``n_keys`` settings."""
+
+        with self._lock:
+            self.load_times[source] = (seconds, n_keys)
+
+        if self.callback is not None: self.callback(dict(type='load', source=source, seconds=seconds, keys=n_keys))
+    #end def
+
+    def hot_keys(self, n=10):
+        """
+        :returns: the ``n`` most frequently looked up keys and their lookup counts, including cast cache hits
+        :rtype: list
+        """
+
+        with self._lock:
+            counts = self.lookups + self.cast_cache_hits
+
+        return counts.most_common(n)
+    #end def
+
+    def report(self):
+        """
+        :returns: a structured summary of all counters and timings, with ``totals``, per ``keys``, and per ``sources`` entries
+        :rtype: dict
+        """
+
+        with self._lock:
+            total_lookups = sum(self.lookups.values())
+            total_cache_hits = sum(self.cache_hits.values())
+
+            keys = OrderedDict()
+            for key in sorted(set(self.lookups) | set(self.cast_cache_hits) | set(self.casts), key=str):
+                keys[key] = dict(lookups=self.lookups[key], cache_hits=self.cache_hits[key], source=self.answered_by.get(key), casts=self.casts[key], cast_cache_hits=self.cast_cache_hits[key], cast_time=self.cast_time[key])
+
+            sources = OrderedDict()
+            for source in list(self.load_times) + [s for s in self.source_answers if s not in self.load_times]:
+                load_time, n_keys = self.load_times.get(source, (None, None))
+                sources[source] = dict(answers=self.source_answers[source], load_time=load_time, keys=n_keys)
+            #end for
+
+            return dict(
+                totals=dict(lookups=total_lookups, cache_hits=total_cache_hits, cache_misses=total_lookups - total_cache_hits, sources_walked=self.sources_walked, casts=sum(self.casts.values()), cast_cache_hits=sum(self.cast_cache_hits.values()), cast_time=sum(self.cast_time.values())),
+                keys=keys,
+                sources=sources,
+            )
+        #end with
+    #end def
+#end class
+
+
+class SourceTrace(object):
+    """
+    The trace of loading a single settings source; times are in seconds, and fields that do not apply to the source are ``None``.
+
+    * ``resolver``: how the source was resolved, i.e., ``env``, ``module``, ``uri``, ``ycs``, ``stream``, ``cache``, ``file``, ``dict``, or ``object``
+    * ``bytes``: number of bytes read (after decompression)
+    * ``resolve_time``: time spent probing whether a string source is a Python module
+    * ``read_time``: time spent opening and reading the source, including network I/O and decompression
+    * ``parse_time``: time spent parsing the content, or executing the Python module
+    * ``total_time``: total time spent loading the source
+    * ``keys``: number of settings in the source
+    """
+
+    __slots__ = ('source', 'resolver', 'bytes', 'resolve_time', 'read_time', 'parse_time', 'total_time', 'keys')
+
+    def __init__(self, source, resolver=None):
+        self.source = source
+        self.resolver = resolver
+        self.bytes = None
+        self.resolve_time = None
+        self.read_time = None
+        self.parse_time = None
+        self.total_time = None
+        self.keys = None
+    #end def
+
+    def _asdict(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+    def __repr__(self):
+        return 'SourceTrace({})'.format(', '.join('{}={!r}'.format(attr, getattr(self, attr)) for attr in self.__slots__))
+#end class
+
+
+def format_source_traces(traces):
+    """
+    Formats ``traces`` as a text table with one row per source, in the order they were loaded, and a total row.
+
+    :param list traces: list of :class:`SourceTrace`
+    :rtype: str
+    """
+
+    def _ms(t): return '-' if t is None else '{:.2f}'.format(t * 1000.0)
+
+    def _n(n): return '-' if n is None else '{:,d}'.format(n)
+
+    rows = [('source', 'resolver', 'bytes', 'resolve ms', 'read ms', 'parse ms', 'total ms', 'keys')]
+    for trace in traces:
+        rows.append((str(trace.source), trace.resolver or '-', _n(trace.bytes), _ms(trace.resolve_time), _ms(trace.read_time), _ms(trace.parse_time), _ms(trace.total_time), _n(trace.keys)))
+    rows.append(('total', '', _n(sum(trace.bytes or 0 for trace in traces)), '', '', '', _ms(sum(trace.total_time or 0.0 for trace in traces)), _n(sum(trace.keys or 0 for trace in traces))))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ['  '.join(cell.ljust(w) if i < 2 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths))).rstrip() for row in rows]
+    lines.insert(1, '  '.join('-' * w for w in widths))
+    lines.insert(len(lines) - 1, lines[1])
+
+    return '\n'.join(lines)
+#end def
@@ -0,0 +1,212 @@
+"""
+This module contains the parsers of settings file formats, and the selection of their backends.
+
+By default, the fastest installed backend is used for each format:
+
+* JSON: `orjson <https://github.com/ijl/orjson>`_, `ujson <https://github.com/ultrajson/ultrajson>`_, or the standard library :mod:`json` module; input that the faster backends would parse differently from :mod:`json` (integers that may not fit in 64 bits, ``NaN``, ``Infinity``) is parsed by :mod:`json`
+* YAML: the libyaml based ``CSafeLoader`` when PyYAML is built with libyaml, or the pure Python ``SafeLoader``
+
+Use :func:`set_backend` to pick a backend explicitly, and :func:`register_parser` to support additional file extensions.
+"""
+
+__all__ = ['register_parser', 'get_parser', 'set_backend', 'get_backend', 'available_backends', 'json_loads', 'yaml_load']
+
+
+from collections import OrderedDict
+from io import TextIOWrapper
+
+
+_BACKENDS = {}  # format -> installed backends, fastest first; detected on first use so that importing ycsettings does not import any parser
+_selected_backends = {}
+
+# integers of 19 or more digits may not fit in 64 bits, and orjson returns them as (rounded) floats; translating digits to "0" and everything else to " " finds runs of digits at the speed of a byte search
+_DIGITS_TABLE = bytes(ord('0') if ord('0') <= i <= ord('9') else ord(' ') for i in range(256))
+_LONG_DIGITS = b'0' * 19
+
+
+def _detect_backends(fmt):
+    backends = OrderedDict()
+
+    if fmt == 'json':
+        try:
+            import orjson
+            backends['orjson'] = _exact_json_loads(orjson.loads)
+        except ImportError: pass
+
+        try:
+            import ujson
+            backends['ujson'] = _exact_json_loads(ujson.loads)
+        except ImportError: pass
+
+        import json
+        backends['json'] = json.loads
+
+    elif fmt == 'yaml':
+        try: import yaml
+        except ImportError: yaml = None
+
+        if yaml is not None:
+            if getattr(yaml, '__with_libyaml__', False): backends['libyaml'] = lambda s: yaml.load(s, Loader=yaml.CSafeLoader)
+            backends['yaml'] = lambda s: yaml.load(s, Loader=yaml.SafeLoader)
+        #end if
+
+    else: raise KeyError(fmt)
+
+    return backends
+#end def
+
+
+def _exact_json_loads(loads):
+    """
+    Wraps the ``loads`` function of a faster JSON backend so that its results are the same as :func:`json.loads`.
+    Input with integers that may not fit in 64 bits, and input that the backend rejects (i.e., ``NaN`` and ``Infinity``), is parsed by :mod:`json` instead; invalid JSON raises the errors of :mod:`json`.
+    """
+
+    import json
+
+    def _loads(s):
+        if isinstance(s, str): data = s.encode('utf-8', 'surrogatepass')
+        elif isinstance(s, (bytes, bytearray)): data = s
+        else: return json.loads(s)  # raises the same TypeError as json
+
+        if _LONG_DIGITS in data.translate(_DIGITS_TABLE): return json.loads(s)
+
+        try: return loads(s)
+        except ValueError: return json.loads(s)
+    #end def
+
+    return _loads
+#end def
+
+
+def _get_backends(fmt):
+    backends = _BACKENDS.get(fmt)
+    if backends is None: backends = _BACKENDS[fmt] = _detect_backends(fmt)
+
+    return backends
+#end def
+
+
+def _get_selected_backend(fmt):
+    selected = _selected_backends.get(fmt)
+    if selected is None: selected = _selected_backends[fmt] = next(iter(_get_backends(fmt).items()), (None, None))
+
+    return selected
+#end def
+
+
+def available_backends(fmt):
+    """
+    :param str fmt: either ``json`` or ``yaml``
+    :returns: names of the installed backends for ``fmt``, fastest first
+    :rtype: list
+    """
+
+    return list(_get_backends(fmt).keys())
+#end def
+
+
+def get_backend(fmt):
+    """
+    :param str fmt: either ``json`` or ``yaml``
+    :returns: name of the backend currently used for ``fmt``
+    :rtype: str
+    """
+
+    return _get_selected_backend(fmt)[0]
+#end def
+
+
+def set_backend(fmt, name=None):
+    """
+    Selects the backend used to parse ``fmt`` files and serialized settings values.
+
+    :param str fmt: either ``json`` or ``yaml``
+    :param str name: name of the backend (see :func:`available_backends`); ``None`` selects the fastest installed backend
+    """
+
+    backends = _get_backends(fmt)
+    if name is None: name = next(iter(backends.keys()), None)
+    if name not in backends: raise ValueError('The {} backend "{}" is not available; installed backends are: {}.'.format(fmt, name, ', '.join(backends.keys())))
+
+    _selected_backends[fmt] = (name, backends[name])
+#end def
+
+
+def json_loads(s):
+    """Parses the JSON :obj:`str` or :obj:`bytes` ``s`` using the selected backend; errors are :exc:`ValueError`."""
+    return _get_selected_backend('json')[1](s)
+
+
+def yaml_load(s):
+    """Parses the YAML :obj:`str` or :obj:`bytes` ``s`` using the selected backend; errors are :exc:`yaml.YAMLError`."""
+    _, loads = _get_selected_backend('yaml')
+    if loads is None: raise ImportError('You need to install the PyYAML package to parse YAML settings.')
+
+    return loads(s)
+#end def
+
+
+def _parse_json(f): return json_loads(f.read())
+
+
+def _parse_yaml(f): return yaml_load(f.read())
+
+
+def _parse_pickle(f):
+    import pickle
+
+    return pickle.load(f)
+#end def
+
+
+def _parse_ini(f):
+    import configparser
+
+    config = configparser.ConfigParser()
+    config.read_file(TextIOWrapper(f))
+
+    return dict((name, value) for section in config.sections() for name, value in config.items(section))
+#end def
+
+
+def _parse_ycs(f):
+    from .ycs import YCSSettings
+
+    return YCSSettings(f.read(), name=getattr(f, 'name', None))
+#end def
+
+
+_PARSERS = {}
+
+
+def register_parser(extensions, parser, format_name=None):
+    """
+    Registers ``parser`` for settings files with any of the file ``extensions``.
+
+    :param list extensions: file extensions including the leading dot, i.e., ``.toml``
+    :param func parser: function that takes a binary file-like object and returns a :func:`dict` of settings
+    :param str format_name: name of the format used in log messages; defaults to the uppercased extension
+    """
+
+    if isinstance(extensions, str): extensions = [extensions]
+    for ext in extensions:
+        _PARSERS[ext.lower()] = (parser, format_name or ext[1:].upper())
+#end def
+
+
+def get_parser(ext):
+    """
+    :param str ext: file extension including the leading dot
+    :returns: a tuple of the parser function and the format name for ``ext``, or ``None`` if the extension is not supported
+    """
+
+    return _PARSERS.get(ext.lower())
+#end def
+
+
+register_parser(['.json', '.js'], _parse_json, 'JSON')
+register_parser('.yaml', _parse_yaml, 'YAML')
+register_parser(['.pkl', '.pickle'], _parse_pickle, 'PKL')
+register_parser('.ini', _parse_ini, 'INI')
+register_parser('.ycs', _parse_ycs, 'YCS')
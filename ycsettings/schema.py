@@ -0,0 +1,142 @@
+"""
+This module contains typed settings schemas, which resolve, cast, and validate a set of settings once, up front.
+
+.. code-block:: python
+
+    schema = Schema({
+        'db_uri': Field('uri', required=True),
+        'n_jobs': Field('njobs', default=1),
+        'timeout': Field('float', default=30.0, validator=lambda t: t > 0),
+        'debug': ('bool', False),
+    })
+    config = schema.compile(Settings('settings.yaml'))
+    config.timeout  # a plain attribute load
+
+All problems (missing required settings, values that cannot be casted, and values rejected by validators) are reported together when the schema is compiled, instead of when each value is first read.
+The compiled object is a snapshot: compile the schema again after :meth:`Settings.reload` to pick up changes.
+"""
+
+__all__ = ['Field', 'Schema', 'InvalidSettingsException']
+
+
+from .settings import MissingSettingException, _get_cast_func
+
+
+_MISSING = object()
+
+
+class InvalidSettingsException(ValueError):
+    pass
+
+
+class Field(object):
+    """The description of a single setting in a :class:`Schema`."""
+
+    __slots__ = ('cast', 'default', 'required', 'validator', 'key')
+
+    def __init__(self, cast=None, default=None, required=False, validator=None, key=None):
+        """
+        :param cast: cast the value of the setting using this function, or its name (``bool``, ``int``, ``float``, ``str``, ``dict``, ``list``, ``uri``, or ``njobs``); default values are not casted
+        :param default: value used when the setting is not found
+        :param bool required: whether a missing setting is an error
+        :param func validator: function that takes the casted value and returns whether it is valid; it may also raise :exc:`ValueError` or :exc:`TypeError`
+        :param str key: settings key to look up; defaults to the attribute name of the field
+        """
+
+        self.cast = _get_cast_func(cast)
+        self.default = default
+        self.required = required
+        self.validator = validator
+        self.key = key
+    #end def
+
+    def __repr__(self):
+        return 'Field(cast={!r}, default={!r}, required={!r}, validator={!r}, key={!r})'.format(self.cast, self.default, self.required, self.validator, self.key)
+#end class
+
+
+class Schema(object):
+    """
+    A declarative schema of settings, whose :meth:`compile` method returns an object with one slotted attribute per field.
+    """
+
+    def __init__(self, fields, name='CompiledSettings'):
+        """
+        :param dict fields: mapping from attribute names to either a :class:`Field`, a cast function (or its name), or a tuple of cast function and default value
+        :param str name: class name of the compiled objects
+        """
+
+        self.fields = {}
+        for attr, field in fields.items():
+            if not attr.isidentifier() or attr.startswith('_'): raise ValueError('"{}" is not a valid schema attribute name; use Field(key=...) for settings keys that are not identifiers.'.format(attr))
+
+            if isinstance(field, tuple): field = Field(*field)
+            elif not isinstance(field, Field): field = Field(field)
+            if field.key is None: field.key = attr
+
+            self.fields[attr] = field
+        #end for
+
+        self._class = type(name, (_CompiledSettings,), {'__slots__': tuple(self.fields.keys())})
+    #end def
+
+    def compile(self, settings, **kwargs):
+        """
+        Resolves all fields using a single :meth:`Settings.get_many` call, then casts and validates them.
+
+        :param Settings settings: settings to resolve the fields from
+        :param kwargs: other keyword arguments of :meth:`Settings.get_many`, i.e., ``case_sensitive``
+        :returns: an instance of the compiled settings class, with one attribute per field
+        :raises MissingSettingException: if required settings are missing
+        :raises InvalidSettingsException: if values cannot be casted or are rejected by their validators
+        """
+
+        keys = list(dict.fromkeys(field.key for field in self.fields.values()))
+        raw_values = settings.get_many(keys, defaults=dict.fromkeys(keys, _MISSING), raise_exception=False, warn_missing=False, **kwargs)
+
+        missing, errors = [], []
+        values = {}
+        for attr, field in self.fields.items():
+            value = raw_values[field.key]
+            if value is _MISSING:
+                if field.required: missing.append(field.key)
+                values[attr] = field.default
+                continue
+            #end if
+
+            try:
+                if field.cast is not None: value = field.cast(value)
+                if field.validator is not None and not field.validator(value): raise ValueError('rejected by validator')
+            except (ValueError, TypeError) as e:
+                errors.append('"{}": {}'.format(field.key, e))
+                continue
+            #end try
+
+            values[attr] = value
+        #end for
+
+        if missing: raise MissingSettingException('The {} settings are missing.'.format(', '.join('"{}"'.format(key) for key in missing)))
+        if errors: raise InvalidSettingsException('Invalid settings: {}.'.format('; '.join(errors)))
+
+        compiled = self._class.__new__(self._class)
+        for attr, value in values.items(): object.__setattr__(compiled, attr, value)
+
+        return compiled
+    #end def
+#end class
+
+
+class _CompiledSettings(object):
+    """Base class of compiled settings objects; they are immutable and support attribute access only."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Compiled settings are read-only.')
+
+    def _asdict(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join('{}={!r}'.format(attr, getattr(self, attr)) for attr in self.__slots__))
+#end class
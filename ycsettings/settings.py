@@ -1,25 +1,28 @@
 __all__ = ['Settings', 'parse_n_jobs', 'MissingSettingException']
 
 
-from collections import OrderedDict, Mapping
-import configparser
-import importlib
-from io import TextIOWrapper
+from collections import OrderedDict
+from collections.abc import Mapping
+from copy import deepcopy
+from io import BytesIO
+from functools import lru_cache, partial
+import importlib.util
 from itertools import chain
-import json
 import logging
-from multiprocessing import cpu_count
 import os
-import pickle
 import re
-from tempfile import NamedTemporaryFile
+import sys
+from threading import Event, Lock, Thread, local
+import time
+import types
 from urllib.parse import ParseResult, urlparse
 import warnings
 
-from uriutils import uri_open
-
-try: import yaml
-except ImportError: pass
+from .cache import SourceCache, conditional_get, source_fingerprint
+from .metrics import SettingsMetrics, SourceTrace
+from .parsers import get_parser, json_loads, yaml_load
+from .streaming import STREAMING_EXTENSIONS, load_streaming
+from . import ycs
 
 
 logger = logging.getLogger(__name__)
@@ -32,6 +35,7 @@ class Settings(Mapping):
 
     * Environment (``env``): The OS environment, i.e., :attr:`os.environ`
     * URI/files: Handles different file types including: JSON, YAML, and INI
+    * Compiled settings: ``.ycs`` files created by ``ycsettings compile`` are memory mapped and decoded lazily (see :mod:`ycsettings.ycs`)
     * Python modules: Python modules similar to Django settings module; it can be a ``.py`` file or module path
     * Dictionary-like objects: Objects with the ``items`` attribute
     * Arbitrary objects: All ``__dict__`` entries not starting with ``__`` are used as settings
@@ -49,9 +53,17 @@ class Settings(Mapping):
         settings = Settings(A, warn_missing=False)
 
     The file specified in ``A.settings_uri`` will be loaded.
+
+    File and URI sources can be reloaded when they change, either explicitly with :meth:`reload` or by polling in a background thread with :meth:`watch`.
+    Use :meth:`on_change` to react to changes of individual settings.
+
+    A :class:`Settings` object can be shared between threads.
+    Reads (:meth:`get` and the typed getters, ``in``, iteration, and :func:`len`) take no locks: each read works on the snapshot that is current when it starts, lazily built structures (caches, the union of keys) are fully built before they are published with a single assignment, and cache entries are only ever added or replaced, never removed (bounded caches are reset by swapping in a new dictionary).
+    Concurrent readers may occasionally compute the same value twice, but never see a partially built one.
+    Locks are only taken on slow paths, i.e., when a lazy source is loaded for the first time, and to serialize :meth:`reload` calls.
     """
 
-    def __init__(self, *sources, search_first=['env', 'env_settings_uri'], case_sensitive=False, raise_exception=False, warn_missing=False, env_settings_uri_keys=['SETTINGS_URI'], dict_settings_uri_keys=['settings', 'settings_uri'], object_settings_uri_keys=['settings', 'settings_uri']):
+    def __init__(self, *sources, search_first=['env', 'env_settings_uri'], case_sensitive=False, raise_exception=False, warn_missing=False, env_settings_uri_keys=['SETTINGS_URI'], dict_settings_uri_keys=['settings', 'settings_uri'], object_settings_uri_keys=['settings', 'settings_uri'], frozen=False, lazy=False, prefetch=False, cache_dir=None, env_prefix=None, reuse_imported_modules=False, stream=False, metrics=None, trace=False, refresh_ttl=None):
         """
         Initializes the :class:`Settings` object.
 
@@ -64,403 +76,1751 @@ class Settings(Mapping):
         :param str env_settings_uri_keys: keys to find settings in the environment; if multiple keys are found, they'll all be used
         :param str dict_settings_uri_keys: keys to find settings in a :func:`dict`-like object; if multiple keys are found, they'll all be used
         :param str object_settings_uri_keys: keys to find settings in an arbitrary object; if multiple keys are found, they'll all be used
+
+        :param bool frozen: whether to resolve the priority chain of all sources once during initialization into a single lookup table; lookups, membership tests, iteration, and length become single hash lookups
+        :param bool lazy: whether to defer opening and parsing of file, URI, and Python module sources until a lookup falls through to them; their priority is unchanged
+        :param prefetch: whether to fetch and parse remote URI sources concurrently on a thread pool during initialization; an :obj:`int` sets the number of threads
+        :type prefetch: bool or int
+        :param str cache_dir: directory to cache parsed file and URI sources in; cached settings are reused as long as the file's size and modification time (or the URI's ``ETag``/``Last-Modified``) are unchanged
+        :param str env_prefix: only use environment variables whose names start with this prefix (i.e., ``MYAPP_``) in the ``env`` source
+        :param bool reuse_imported_modules: whether to use the attributes of an already imported module for module path sources instead of executing the module again
+        :param metrics: whether to record lookup and load counters and timings in :attr:`metrics` (see :mod:`ycsettings.metrics`); a :class:`~ycsettings.metrics.SettingsMetrics` object can be given to use a callback or share it between objects
+        :type metrics: bool or SettingsMetrics
+        :param bool trace: whether to record how each source is loaded (resolver, bytes read, and resolve/read/parse times) as :class:`~ycsettings.metrics.SourceTrace` objects in :attr:`source_traces`
+        :param bool stream: whether to index local JSON, JSON lines, and YAML files (see :mod:`ycsettings.streaming`) and only parse their top level values when they are accessed, instead of parsing the whole file up front
+        :param refresh_ttl: minimum number of seconds between checks of a file or URI source for changes by :meth:`reload` (and :meth:`watch`); a mapping from source URIs to seconds sets it per source
+        :type refresh_ttl: float or dict
         """
 
         self.case_sensitive = case_sensitive
         self.raise_exception = raise_exception
         self.warn_missing = warn_missing
 
+        self.env_prefix = env_prefix
+        self.reuse_imported_modules = reuse_imported_modules
+        self.stream = stream
         self.env_settings_uri_keys = env_settings_uri_keys
         self.dict_settings_uri_keys = dict_settings_uri_keys
         self.object_settings_uri_keys = object_settings_uri_keys
-
-        self._cache = {}
-        self._settings = OrderedDict()
-        self._union_keys = None
+        self.metrics = SettingsMetrics() if metrics is True else (metrics or None)
+        self.source_traces = [] if trace else None
+        self._trace_local = local()
+
+        self._snapshot = snapshot = _Snapshot()
+        self._frozen_mode = frozen
+        self._defer_loading = lazy or bool(prefetch)
+        self._source_cache = None if cache_dir is None else SourceCache(cache_dir)
+        self._fingerprints = {}
+        self.refresh_ttl = refresh_ttl
+        self._last_checked = {}  # URI -> time.monotonic() of its last load or check for changes
+        self._change_callbacks = {}
+        self._reload_lock = Lock()
+        self._watcher = None
+        self._additional_sources = OrderedDict()  # LRU cache of loaded additional sources of get()
+        self._additional_sources_lock = Lock()
 
         for source in chain(search_first, filter(None, sources)):
             for name, settings in self._load_settings_from_source(source):
-                if not settings: continue
+                if not settings and not isinstance(settings, _EnvironSource): continue  # the environment can change later
 
-                if name in self._settings:
+                if name in snapshot.settings:
                     warnings.warn('{} appeared more than once in the settings priority list.'.format(name))
 
-                self._settings[name] = settings
+                snapshot.settings[name] = settings
+                if not isinstance(settings, _DeferredSource):
+                    snapshot.key_indexes[name] = self._build_key_index(name, settings)
             #end for
         #end for
+
+        self._defer_loading = lazy
+        if prefetch:
+            self._prefetch(max_workers=None if prefetch is True else prefetch)
+            if not lazy:
+                for _ in self._iter_sources(): pass  # load the remaining local sources in priority order
+        #end if
+
+        if frozen: self._freeze(snapshot)
     #end def
 
-    def _load_settings_from_source(self, source):
+    def _prefetch(self, max_workers=None):
         """
-        Loads the relevant settings from the specified ``source``.
+        Loads all deferred remote URI sources concurrently using a thread pool; the priority order of sources is unchanged.
 
-        :returns: a standard :func:`dict` containing the settings from the source
-        :rtype: dict
+        :param int max_workers: number of threads to use; defaults to one thread per remote source
         """
-        if not source:
-            pass
-        elif source == 'env_settings_uri':
-            for env_settings_uri_key in self.env_settings_uri_keys:
-                env_settings_uri = self._search_environ(env_settings_uri_key)
-                if env_settings_uri:
-                    logger.debug('Found {} in the environment.'.format(env_settings_uri_key))
-                    yield env_settings_uri, self._load_settings_from_uri(env_settings_uri)
-                #end if
-            #end for
-
-        elif source == 'env':
-            logger.debug('Loaded {} settings from the environment.'.format(len(os.environ)))
-            yield source, dict(os.environ.items())
 
-        elif isinstance(source, ParseResult):
-            settings = self._load_settings_from_uri(source)
-            yield source, settings
+        snapshot = self._snapshot
+        remote_sources = [(name, settings) for name, settings in snapshot.settings.items() if isinstance(settings, _DeferredSource) and _is_remote_uri(settings.source)]
+        if not remote_sources: return
 
-        elif isinstance(source, str):
-            try: spec = importlib.util.find_spec(source)
-            except (AttributeError, ImportError): spec = None
-
-            settings = self._load_settings_from_spec(spec, name=source)
-            if settings is None:
-                _, ext = os.path.splitext(source)
-                with uri_open(source, 'rb') as f:
-                    yield source, self._load_settings_from_file(f, ext=ext)
-            else:
-                yield source, settings
-            #end if
+        from concurrent.futures import ThreadPoolExecutor
 
-        elif hasattr(source, 'read'):
-            yield source.name, self._load_settings_from_file(source)
+        with ThreadPoolExecutor(max_workers=max_workers or len(remote_sources)) as executor:
+            futures = [(name, executor.submit(deferred.load)) for name, deferred in remote_sources]
+            for name, future in futures:
+                self._set_loaded(snapshot, name, future.result())
+        #end with
 
-        elif hasattr(source, 'items'):
-            source_type = type(source).__name__
-            for dict_settings_uri_key in self.dict_settings_uri_keys:
-                if dict_settings_uri_key and dict_settings_uri_key in source and source[dict_settings_uri_key]:
-                    logger.debug('Found {} in the dict-like object <{}>.'.format(dict_settings_uri_key, source_type))
-                    yield from self._load_settings_from_source(source[dict_settings_uri_key])
-                #end if
-            #end for
+        logger.debug('Prefetched {} remote settings sources.'.format(len(remote_sources)))
+    #end def
 
-            logger.debug('Loaded {} settings from dict-like object <{}>.'.format(len(source), source_type))
-            yield self._get_unique_name(source_type), source
+    def _freeze(self, snapshot):
+        """
+        Resolves the priority chain of all sources of ``snapshot`` into a single mapping from normalized keys to tuples of value and source name.
+        """
 
-        else:
-            source_type = type(source).__name__
-            for object_settings_uri_key in self.object_settings_uri_keys:
-                if object_settings_uri_key and hasattr(source, object_settings_uri_key) and getattr(source, object_settings_uri_key):
-                    logger.debug('Found {} in the object <{}>.'.format(object_settings_uri_key, source_type))
-                    yield from self._load_settings_from_source(getattr(source, object_settings_uri_key))
-                #end if
+        frozen = {}
+        for name, settings, _ in self._iter_sources(snapshot=snapshot):
+            for k, v in settings.items():
+                if not self.case_sensitive and isinstance(k, str): k = k.lower()
+                if k not in frozen: frozen[k] = (v, name)
             #end for
+        #end for
 
-            settings = dict((k, v) for k, v in source.__dict__.items() if not k.startswith('__'))
-            logger.debug('Loaded {} settings from object <{}>.'.format(len(settings), source_type))
-            yield self._get_unique_name(source_type), settings
-        #end if
+        snapshot.union_keys = list(frozen.keys())
+        snapshot.frozen = frozen
     #end def
 
-    def _get_unique_name(self, prefix):
-        i = 0
-        name = '{}_{}'.format(prefix, i)
-        while name in self._settings:
-            i += 1
-            name = '{}_{}'.format(prefix, i)
-        #end while
-        return name
-    #end def
+    def reload(self, force=False):
+        """
+        Reloads the file and URI sources that changed since they were loaded, i.e., whose size and modification time (or ``ETag``/``Last-Modified`` for remote URIs) differ.
+        HTTP(S) sources are checked with a conditional ``GET``, so that unchanged sources are neither downloaded nor parsed; sources checked less than ``refresh_ttl`` seconds ago are skipped.
+        Only the cached values of keys that appear in the reloaded sources (before or after reloading) are discarded.
+        The reloaded sources are combined with the unchanged ones into a new snapshot which is swapped in atomically; readers on other threads see either the old or the new settings, and never a partially reloaded state or stale cached values.
+        Change callbacks registered with :meth:`on_change` are called after the swap.
+        Sources that fail to reload are logged and keep their previous settings.
+        Cached ``additional_sources`` of :meth:`get` whose files or URIs changed (or all of them, with ``force``) are discarded, so that they are loaded again on their next use.
+
+        :param bool force: whether to reload all file and URI sources, even if they seem unchanged
+        :returns: names of the reloaded sources
+        :rtype: list
+        """
 
-    def _load_settings_from_spec(self, spec, name=None):
-        if spec is None: return None
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        settings = dict((k, v) for k, v in mod.__dict__.items() if not k.startswith('__'))
-        if name: logger.debug('Loaded {} settings from Python module <{}>.'.format(len(settings), name))
+        self._invalidate_additional_sources(force=force)
 
-        return settings
-    #end def
+        with self._reload_lock:
+            old_snapshot = self._snapshot
+            settings = OrderedDict(old_snapshot.settings)
+            key_indexes = dict(old_snapshot.key_indexes)
+            reloaded = []
 
-    def _load_settings_from_uri(self, uri):
-        _, ext = os.path.splitext(uri)
-        with uri_open(uri) as f:
-            settings = self._load_settings_from_file(f, ext=ext)
+            candidates = []
+            for name, source_settings in old_snapshot.settings.items():
+                if isinstance(source_settings, _DeferredSource): continue
 
-        logger.debug('Loaded {} settings from URI <{}>.'.format(len(settings), uri))
-        return settings
-    #end def
+                uri = name.geturl() if isinstance(name, ParseResult) else name
+                if uri not in self._fingerprints: continue
 
-    def _load_settings_from_file(self, f, ext=None):
-        if ext is None or ext == '.gz':
-            name = f.name[:-3] if f.name.endswith('.gz') else f.name
-            basename, ext = os.path.splitext(name)
-        #end if
-        ext = ext.lower()
-        ext_type = ext[1:].upper()
-
-        if ext in ('.json', '.js'): d = json.load(f)
-        elif ext == '.yaml': d = yaml.load(f)
-        elif ext in ('.pkl', '.pickle'): d = pickle.load(f)
-        elif ext in ['.ini']:
-            config = configparser.ConfigParser()
-            config.read_file(TextIOWrapper(f))
-            d = dict((name, value) for section in config.sections() for name, value in config.items(section))
-
-        elif ext in ['.py']:
-            temp_fname = None
-            ext_type = 'Python module'
-            try:
-                with NamedTemporaryFile(mode='wb', suffix='.py', delete=False) as g:
-                    g.write(f.read())
-                    temp_fname = g.name
-                #end with
+                ttl = self._get_refresh_ttl(uri)
+                if not force and ttl and time.monotonic() - self._last_checked.get(uri, 0.0) < ttl: continue
 
-                d = self._load_settings_from_spec(importlib.util.spec_from_file_location('settings_module', os.path.abspath(temp_fname)))
+                candidates.append((name, uri))
+            #end for
 
-            finally:
-                os.remove(temp_fname)
+            uris = [uri for _, uri in candidates]
+            if sum(1 for uri in uris if _is_remote_uri(uri)) > 1:
+                from concurrent.futures import ThreadPoolExecutor
 
-        else: raise ValueError('Unknown settings file format: {}'.format(ext))
+                with ThreadPoolExecutor(max_workers=len(uris)) as executor:
+                    results = list(executor.map(partial(self._reload_source, force=force), uris))
+            else: results = [self._reload_source(uri, force=force) for uri in uris]
 
-        if d is None: d = {}
+            for (name, uri), result in zip(candidates, results):
+                if result is None: continue
 
-        logger.debug('Loaded {} {} settings from <{}>.'.format(len(d), ext_type, f.name))
+                fingerprint, source_settings = result
+                self._fingerprints[uri] = fingerprint
+                key_indexes[name] = self._build_key_index(name, source_settings)
+                settings[name] = source_settings
+                reloaded.append(name)
+            #end for
 
-        return d
-    #end def
+            if not reloaded: return reloaded
 
-    def get(self, key, *, default=None, cast_func=None, case_sensitive=None, raise_exception=None, warn_missing=None, use_cache=True, additional_sources=[]):
-        """
-        Gets the setting specified by ``key``. For efficiency, we cache the retrieval of settings to avoid multiple searches through the sources list.
+            snapshot = _Snapshot(settings, key_indexes)
+            self._keep_unaffected(old_snapshot, snapshot, reloaded)
+            if self._frozen_mode: self._freeze(snapshot)
 
-        :param str key: settings key to retrieve
-        :param str default: use this as default value when the setting key is not found
-        :param func cast_func: cast the value of the settings using this function
-        :param bool case_sensitive: whether to make case sensitive comparisons for settings key
-        :param bool raise_exception: whether to raise a :exc:`MissingSettingException` exception when the setting is not found
-        :param bool warn_missing: whether to display a warning when the setting is not found
-        :param list additional_sources: additional sources to search for the key; note that the values obtained here could be cached in a future call
+            changes = []
+            for key, callbacks in self._change_callbacks.items():
+                callbacks = list(callbacks)
+                _, old_value, _ = self._lookup(key, self.case_sensitive, snapshot=old_snapshot)
+                _, new_value, _ = self._lookup(key, self.case_sensitive, snapshot=snapshot)
+                if old_value != new_value: changes.append((key, callbacks, old_value, new_value))
+            #end for
 
-        :returns: the setting value
-        :rtype: str
+            self._snapshot = snapshot
+            logger.info('Reloaded {} settings sources: {}'.format(len(reloaded), ', '.join(map(str, reloaded))))
+        #end with
+
+        for key, callbacks, old_value, new_value in changes:
+            for callback in callbacks:
+                try: callback(key, old_value, new_value)
+                except Exception: logger.exception('Error in settings change callback for "{}".'.format(key))
+            #end for
+        #end for
+
+        return reloaded
+    #end def
+
+    def _reload_source(self, uri, force=False):
         """
+        Loads the file or URI source ``uri`` again if its fingerprint changed (or ``force`` is set).
+        HTTP(S) sources are downloaded with a conditional ``GET`` (see :func:`~ycsettings.cache.conditional_get`) instead of a ``HEAD`` request followed by a ``GET``.
+        When their server sends neither ``ETag`` nor ``Last-Modified``, they are only checked if they have a ``refresh_ttl``, with an unconditional ``GET``; the content is compared with the digest of the previous one so that unchanged content is not parsed again.
 
-        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
-        raise_exception = self.raise_exception if raise_exception is None else raise_exception
-        warn_missing = self.warn_missing if warn_missing is None else warn_missing
+        :returns: a tuple of the new fingerprint and settings, or ``None`` if the source is unchanged or fails to load
+        :rtype: tuple
+        """
 
-        if not case_sensitive: key = key.lower()
+        self._last_checked[uri] = time.monotonic()
 
-        if use_cache and key in self._cache:
-            return cast_func(self._cache[key]) if cast_func else self._cache[key]
+        load_func = self._load_settings_from_uri
+        downloaded = False  # whether the content was downloaded here, so that it is not cached by _load_settings_from_uri
+        try:
+            if _is_http_uri(uri):
+                previous = self._fingerprints[uri]
+                if not force and (previous is None or previous[0] == 'digest') and self._get_refresh_ttl(uri) is None: return None  # no validators and no refresh policy
+
+                fingerprint, content = conditional_get(uri, None if force else previous)
+                if content is not None and fingerprint is None:
+                    fingerprint = _content_digest(uri, content)
+                    if not force and fingerprint == previous: content = None
+                #end if
 
-        found, value = False, None
+                if content is None:
+                    logger.debug('Settings at <{}> are not modified.'.format(uri))
+                    return None
+                #end if
 
-        for source, settings in chain(self._settings.items(), map(self._load_settings_from_source, additional_sources)):
-            if case_sensitive:
-                if key in settings:
-                    found = True
-                    value = settings[key]
-                else: continue
+                load_func = partial(self._load_settings_from_content, content=content)
+                downloaded = True
 
             else:
-                possible_keys = [k for k in settings.keys() if k.lower() == key]
-                if not possible_keys: continue
-                else:
-                    if len(possible_keys) > 1:
-                        warnings.warn('There are more than one possible value for "{}" in <{}> settings due to case insensitivity.'.format(key, source))
-
-                    found = True
-                    value = settings[possible_keys[0]]
-                #end if
+                fingerprint = source_fingerprint(uri)
+                if not force and (fingerprint is None or fingerprint == self._fingerprints[uri]): return None
             #end if
 
-            if found: break
-        #end for
-
-        if not found:
-            if raise_exception: raise MissingSettingException('The "{}" setting is missing.'.format(key))
-            if warn_missing: warnings.warn('The "{}" setting is missing.'.format(key))
+            source_settings = (load_func(uri) if self.metrics is None else self._load_timed(load_func, uri)) or {}
 
-            return default
-        #end if
+        except Exception as e:
+            logger.warning('Unable to reload settings from <{}>: {}'.format(uri, e))
+            return None
+        #end try
 
-        if use_cache: self._cache[key] = value
-        if cast_func: value = cast_func(value)
+        if downloaded and fingerprint[0] != 'digest' and self._source_cache is not None: self._source_cache.put(uri, fingerprint, source_settings)
 
-        return value
+        return fingerprint, source_settings
     #end def
 
-    def getbool(self, key, **kwargs):
+    def _get_refresh_ttl(self, uri):
+        """Returns the ``refresh_ttl`` of ``uri`` in seconds, or ``None`` if it has none."""
+        return self.refresh_ttl.get(uri) if isinstance(self.refresh_ttl, Mapping) else self.refresh_ttl
+
+    def _keep_unaffected(self, old_snapshot, snapshot, reloaded):
+        """
+        Copies the cached raw values, casted values, and missing keys of ``old_snapshot`` into ``snapshot``, except for the keys that appear in the ``reloaded`` sources of either snapshot, since only their lookups can change.
         """
-        Gets the setting value as a :func:`bool` by cleverly recognizing true values.
 
-        :rtype: bool
+        affected = set()
+        for name in reloaded:
+            for source_settings in (old_snapshot.settings.get(name), snapshot.settings[name]):
+                if source_settings is None or isinstance(source_settings, _DeferredSource): continue
+
+                for k in source_settings.keys():
+                    affected.add(k)
+                    if isinstance(k, str): affected.add(k.lower())
+                #end for
+            #end for
+        #end for
+
+        # dict.copy() does not run Python code, so readers can keep filling the old caches meanwhile
+        for attr in ('cache', 'cast_cache', 'missing'):
+            d = getattr(old_snapshot, attr).copy()
+            for k in affected: d.pop(k, None)
+            setattr(snapshot, attr, d)
+        #end for
+    #end def
+
+    @classmethod
+    async def create(cls, *sources, prefetch=True, **kwargs):
         """
+        Creates a :class:`Settings` object without blocking the running event loop; sources are opened and parsed on a worker thread, and remote URI sources are fetched concurrently (see ``prefetch``).
+        Lookups of the returned object are synchronous as usual.
 
-        def _string_to_bool(s):
-            if isinstance(s, str):
-                if s.strip().lower() in ('true', 't', '1'): return True
-                elif s.strip().lower() in ('false', 'f', '0', 'None', 'null', ''): return False
+        .. code-block:: python
 
-                raise ValueError('Unable to get boolean value of "{}".'.format(s))
-            #end if
+            settings = await Settings.create('https://config.example.com/settings.json', 'settings.yaml')
 
-            return bool(s)
-        #end def
+        :param list sources: list of sources to search for settings
+        :param prefetch: see :class:`Settings`
+        :param kwargs: other arguments of :class:`Settings`
+        :rtype: Settings
+        """
 
-        return self.get(key, cast_func=_string_to_bool, **kwargs)
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(None, partial(cls, *sources, prefetch=prefetch, **kwargs))
     #end def
 
-    def getint(self, key, **kwargs):
+    async def areload(self, force=False):
         """
-        Gets the setting value as a :obj:`int`.
+        Same as :meth:`reload`, but checks and loads the sources on a worker thread instead of blocking the running event loop; changed remote sources are fetched concurrently.
 
-        :rtype: int
+        :param bool force: whether to reload all file and URI sources, even if they seem unchanged
+        :returns: names of the reloaded sources
+        :rtype: list
         """
 
-        return self.get(key, cast_func=int, **kwargs)
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(None, partial(self.reload, force=force))
     #end def
 
-    def getfloat(self, key, **kwargs):
+    async def aget(self, key, **kwargs):
         """
-        Gets the setting value as a :obj:`float`.
+        Same as :meth:`get`, for use in coroutines.
+        Lookups that may open a source, i.e., with ``additional_sources`` or while lazy sources are not loaded yet, run on a worker thread; all other lookups return immediately.
 
-        :rtype: float
+        :param str key: settings key to retrieve
+        :param kwargs: arguments of :meth:`get`
+        :returns: the setting value
         """
 
-        return self.get(key, cast_func=float, **kwargs)
+        if not kwargs.get('additional_sources') and not any(isinstance(settings, _DeferredSource) for settings in self._snapshot.settings.values()): return self.get(key, **kwargs)
+
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(None, partial(self.get, key, **kwargs))
     #end def
 
-    def getdict(self, key, **kwargs):
+    def on_change(self, key, callback):
         """
-        Gets the setting value as a :obj:`dict`.
+        Registers ``callback`` to be called as ``callback(key, old_value, new_value)`` when :meth:`reload` changes the raw value of ``key``; a missing value is ``None``.
 
-        :rtype: dict
+        :param str key: settings key to watch
+        :param func callback: function to call with the key, its old value, and its new value
         """
 
-        return self.getserialized(key, **kwargs)
+        if not self.case_sensitive: key = key.lower()
+        with self._reload_lock:
+            self._change_callbacks.setdefault(key, []).append(callback)
     #end def
 
-    def getserialized(self, key, decoder_func=None, **kwargs):
+    def watch(self, interval=1.0):
         """
-        Gets the setting value as a :obj:`dict` or :obj:`list` trying :meth:`json.loads`, followed by :meth:`yaml.load`.
+        Starts a background daemon thread that polls for changed sources and calls :meth:`reload` every ``interval`` seconds.
 
-        :rtype: dict, list
+        :param float interval: number of seconds between polls
         """
 
-        value = self.get(key, cast_func=None, **kwargs)
+        if self._watcher is not None: return
 
-        if isinstance(value, (dict, list, tuple)) or value is None:
-            return value
+        stop_event = Event()
 
-        if decoder_func: return decoder_func(value)
+        def _watch():
+            while not stop_event.wait(interval):
+                try: self.reload()
+                except Exception: logger.exception('Error while reloading settings.')
+            #end while
+        #end def
 
-        try:
-            o = json.loads(value)
-            return o
-        except json.decoder.JSONDecodeError: pass
+        thread = Thread(target=_watch, name='ycsettings-watcher', daemon=True)
+        self._watcher = (thread, stop_event)
+        thread.start()
+    #end def
 
-        try:
-            o = yaml.load(value)
-            return o
-        except yaml.parser.ParserError: pass
+    def stop_watching(self):
+        """
+        Stops the background thread started by :meth:`watch`.
+        """
 
-        raise ValueError('Unable to parse {} setting using JSON or YAML.'.format(key))
+        if self._watcher is None: return
+
+        thread, stop_event = self._watcher
+        stop_event.set()
+        thread.join()
+        self._watcher = None
     #end def
 
-    def geturi(self, key, **kwargs):
+    def with_overrides(self, overrides=None, **kwargs):
         """
-        Gets the setting value as a :class:`urllib.parse.ParseResult`.
+        Creates a lightweight view of these settings with ``overrides`` on top, i.e., for request or tenant scoped settings.
+        The view shares all sources and caches with this object, and only keeps its own override layer and casted values of overrides; creating it does not load anything.
+        Lookups of keys that are not overridden are delegated to this object, so the view follows :meth:`reload`.
 
-        :rtype: urllib.parse.ParseResult
+        :param dict overrides: settings that take precedence over all sources
+        :param kwargs: more overrides
+        :rtype: Settings
         """
 
-        return self.get(key, cast_func=urlparse, **kwargs)
+        overrides = dict(overrides or {}, **kwargs)
+
+        return _SettingsOverlay(self, overrides)
     #end def
 
-    def getlist(self, key, delimiter=',', **kwargs):
+    def share(self, name=None):
         """
-        Gets the setting value as a :class:`list`; it splits the string using ``delimiter``.
+        Publishes the resolved settings into shared memory, for worker processes to attach to with :class:`ycsettings.shared.SharedSettings`.
+        See :func:`ycsettings.shared.share`.
 
-        :param str delimiter: split the value using this delimiter
-        :rtype: list
+        :rtype: multiprocessing.shared_memory.SharedMemory
         """
 
-        value = self.get(key, **kwargs)
-        if value is None: return value
-        if isinstance(value, str):
-            value = value.strip()
-            if value.startswith('[') and value.endswith(']'):
-                return self.getserialized(key)
-
-            return [p.strip(' ') for p in value.split(delimiter)]
-        #end if
+        from .shared import share
 
-        return list(value)
+        return share(self, name=name)
     #end def
 
-    def getnjobs(self, key, **kwargs):
+    def _build_key_index(self, name, settings):
         """
-        Gets the setting value as an integer relative to the number of CPU.
-        See :func:`ycsettings.settings.parse_n_jobs` for parsing rules.
+        Builds the case insensitive index of a source, i.e., a mapping from lowercased keys to the original keys in ``settings``.
+        When several keys collide after lowercasing, the first one wins and we warn once here instead of on every lookup.
 
-        :rtype: int
+        :returns: a mapping from lowercased keys to keys in ``settings``
+        :rtype: dict
         """
 
-        return self.get(key, cast_func=parse_n_jobs, **kwargs)
-    #end def
+        if isinstance(settings, (_EnvironSource, ycs.YCSSettings)): return settings.key_index
 
-    def _search_environ(self, key, default=None):
-        key = key.lower()
-        for k, v in os.environ.items():
-            if k.lower() == key:
-                return v
+        index = {}
+        for k in settings.keys():
+            if not isinstance(k, str): continue
+
+            lower_k = k.lower()
+            if lower_k in index:
+                if not self.case_sensitive:
+                    warnings.warn('There are more than one possible value for "{}" in <{}> settings due to case insensitivity.'.format(lower_k, name))
+                continue
+            #end if
+
+            index[lower_k] = k
+        #end for
 
-        return default
+        return index
     #end def
 
-    def __getitem__(self, key):
-        return self.get(key)
+    def _load_settings_from_source(self, source):
+        """
+        Loads the relevant settings from the specified ``source``.
 
-    def __iter__(self):
-        if self._union_keys is None:
-            keys = set()
-            self._union_keys = []
-            for source, settings in self._settings.items():
-                for k, v in settings.items():
-                    k = k if self.case_sensitive else k.lower()
-                    if k in keys: continue
-
-                    keys.add(k)
-                    self._union_keys.append(k)
-                    yield k
-                #end for
+        :returns: a standard :func:`dict` containing the settings from the source
+        :rtype: dict
+        """
+        if not source:
+            pass
+        elif source == 'env_settings_uri':
+            for env_settings_uri_key in self.env_settings_uri_keys:
+                env_settings_uri = self._search_environ(env_settings_uri_key)
+                if env_settings_uri:
+                    logger.debug('Found {} in the environment.'.format(env_settings_uri_key))
+                    yield env_settings_uri, self._defer_or_load(self._load_settings_from_uri, env_settings_uri)
+                #end if
+            #end for
+
+        elif source == 'env':
+            if self.source_traces is not None: start_time = time.perf_counter()
+            settings = _EnvironSource(prefix=self.env_prefix)
+            logger.debug('Loaded {} settings from the environment.'.format(len(settings)))
+            if self.source_traces is not None: self._add_trace(source, 'env', start_time, settings)
+            yield source, settings
+
+        elif isinstance(source, ParseResult):
+            yield source, self._defer_or_load(self._load_settings_from_uri, source)
+
+        elif isinstance(source, str):
+            yield source, self._defer_or_load(self._load_settings_from_string, source)
+
+        elif hasattr(source, 'read'):
+            if self.source_traces is None: yield source.name, self._load_settings_from_file(source)
+            else: yield source.name, self._load_traced(self._load_settings_from_file, source, name=source.name, resolver='file')
+
+        elif hasattr(source, 'items'):
+            source_type = type(source).__name__
+            for dict_settings_uri_key in self.dict_settings_uri_keys:
+                if dict_settings_uri_key and dict_settings_uri_key in source and source[dict_settings_uri_key]:
+                    logger.debug('Found {} in the dict-like object <{}>.'.format(dict_settings_uri_key, source_type))
+                    yield from self._load_settings_from_source(source[dict_settings_uri_key])
+                #end if
             #end for
+
+            logger.debug('Loaded {} settings from dict-like object <{}>.'.format(len(source), source_type))
+            name = self._get_unique_name(source_type)
+            if self.source_traces is not None: self._add_trace(name, 'dict', time.perf_counter(), source)
+            yield name, source
+
         else:
-            yield from self._union_keys
+            source_type = type(source).__name__
+            for object_settings_uri_key in self.object_settings_uri_keys:
+                if object_settings_uri_key and hasattr(source, object_settings_uri_key) and getattr(source, object_settings_uri_key):
+                    logger.debug('Found {} in the object <{}>.'.format(object_settings_uri_key, source_type))
+                    yield from self._load_settings_from_source(getattr(source, object_settings_uri_key))
+                #end if
+            #end for
+
+            if self.source_traces is not None: start_time = time.perf_counter()
+            settings = dict((k, v) for k, v in source.__dict__.items() if not k.startswith('__'))
+            logger.debug('Loaded {} settings from object <{}>.'.format(len(settings), source_type))
+            name = self._get_unique_name(source_type)
+            if self.source_traces is not None: self._add_trace(name, 'object', start_time, settings)
+            yield name, settings
         #end if
     #end def
 
-    def __len__(self):
-        if self._union_keys is None:
-            [k for k in self.__iter__()]  # just to run through the whole thing and build _union_keys
+    def _defer_or_load(self, load_func, source):
+        """
+        Loads the settings from ``source`` using ``load_func``, or wraps it in a :class:`_DeferredSource` in lazy mode.
+        """
+
+        if self.metrics is not None: load_func = partial(self._load_timed, load_func)
+        if self.source_traces is not None: load_func = partial(self._load_traced, load_func, name=source.geturl() if isinstance(source, ParseResult) else source)
 
-        return len(self._union_keys)
+        if self._defer_loading: return _DeferredSource(load_func, source)
+        return load_func(source)
     #end def
-#end class
 
+    def _load_traced(self, load_func, source, name, resolver=None):
+        """Calls ``load_func(source)`` and appends its :class:`~ycsettings.metrics.SourceTrace` to :attr:`source_traces`; the loaders fill in the details through :meth:`_current_trace`."""
 
-class MissingSettingException(Exception):
-    pass
+        trace = SourceTrace(name, resolver)
+        self._trace_local.trace = trace
+        start_time = time.perf_counter()
+        try: settings = load_func(source)
+        finally: self._trace_local.trace = None
 
+        trace.total_time = time.perf_counter() - start_time
+        trace.keys = 0 if settings is None else len(settings)
+        self.source_traces.append(trace)
 
-def parse_n_jobs(s):
-    """
-    This function parses a "math"-like string as a function of CPU count.
-    It is useful for specifying the number of jobs.
+        return settings
+    #end def
 
-    For example, on an 8-core machine::
+    def _add_trace(self, name, resolver, start_time, settings):
+        trace = SourceTrace(name, resolver)
+        trace.total_time = time.perf_counter() - start_time
+        trace.keys = len(settings)
+        self.source_traces.append(trace)
+    #end def
 
-        assert parse_n_jobs('0.5 * n') == 4
+    def _current_trace(self):
+        """Returns the :class:`~ycsettings.metrics.SourceTrace` of the source being loaded by this thread, or ``None`` when tracing is disabled."""
+        return getattr(self._trace_local, 'trace', None)
+
+    def _load_timed(self, load_func, source):
+        """Calls ``load_func(source)`` and records its duration in :attr:`metrics`."""
+
+        start_time = time.perf_counter()
+        settings = load_func(source)
+        self.metrics.record_load(source.geturl() if isinstance(source, ParseResult) else str(source), time.perf_counter() - start_time, len(settings) if settings is not None else 0)
+
+        return settings
+    #end def
+
+    def _load_deferred(self, snapshot, name):
+        """
+        Loads the :class:`_DeferredSource` of ``name`` in ``snapshot``; concurrent callers wait for the first one instead of loading the source again.
+
+        :returns: the loaded settings
+        :rtype: dict
+        """
+
+        with snapshot.load_lock:
+            settings = snapshot.settings[name]
+            if isinstance(settings, _DeferredSource): settings = self._set_loaded(snapshot, name, settings.load())
+        #end with
+
+        return settings
+    #end def
+
+    def _set_loaded(self, snapshot, name, settings):
+        """
+        Replaces the :class:`_DeferredSource` of ``name`` in the priority list of ``snapshot`` with its loaded ``settings``.
+        The key index is published before the settings so that readers never see loaded settings without their index.
+
+        :returns: the loaded settings
+        :rtype: dict
+        """
+
+        settings = settings or {}
+        snapshot.key_indexes[name] = self._build_key_index(name, settings)
+        snapshot.settings[name] = settings
+
+        return settings
+    #end def
+
+    def _load_settings_from_string(self, source):
+        """
+        Loads the settings from a string source, which is either a Python module path or a file path/URI.
+        URIs and paths are loaded directly, without probing for a module with :func:`importlib.util.find_spec` (which walks :data:`sys.path` and imports parent packages).
+        Dotted names with a settings file extension (i.e., ``settings.yaml``) are loaded as files first, and only looked up as modules when there is no such file.
+        """
+
+        kind = _classify_string_source(source)
+        missing_error = None
+        if kind == 'uri' or _has_settings_extension(source):
+            try: return self._load_settings_from_uri(source)
+            except FileNotFoundError as e:
+                if kind == 'uri': raise
+                missing_error = e
+                self._fingerprints.pop(source, None)
+            #end try
+        #end if
+
+        trace = self._current_trace()
+        if trace is not None: start_time = time.perf_counter()
+
+        try: spec = importlib.util.find_spec(source)
+        except (AttributeError, ImportError): spec = None
+
+        if trace is not None: trace.resolve_time = time.perf_counter() - start_time
+
+        settings = self._load_settings_from_spec(spec, name=source)
+        if settings is None:
+            if missing_error is not None: raise missing_error
+            settings = self._load_settings_from_uri(source)
+        #end if
+
+        return settings
+    #end def
+
+    def _get_unique_name(self, prefix):
+        i = 0
+        name = '{}_{}'.format(prefix, i)
+        while name in self._snapshot.settings:
+            i += 1
+            name = '{}_{}'.format(prefix, i)
+        #end while
+        return name
+    #end def
+
+    def _load_settings_from_spec(self, spec, name=None):
+        if spec is None: return None
+
+        trace = self._current_trace()
+        if trace is not None:
+            trace.resolver = 'module'
+            if spec.has_location and os.path.isfile(spec.origin): trace.bytes = os.path.getsize(spec.origin)
+            start_time = time.perf_counter()
+        #end if
+
+        if self.reuse_imported_modules and spec.name in sys.modules:
+            mod = sys.modules[spec.name]
+        else:
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+        #end if
+
+        if trace is not None: trace.parse_time = time.perf_counter() - start_time
+
+        settings = dict((k, v) for k, v in mod.__dict__.items() if not k.startswith('__'))
+        if name: logger.debug('Loaded {} settings from Python module <{}>.'.format(len(settings), name))
+
+        return settings
+    #end def
+
+    def _load_settings_from_uri(self, uri):
+        if isinstance(uri, ParseResult): uri = uri.geturl()
+
+        fingerprint = None
+        if self._source_cache is not None or not _is_remote_uri(uri): fingerprint = source_fingerprint(uri)
+        self._fingerprints[uri] = fingerprint  # remembered so that :meth:`reload` can tell if the source changed
+        self._last_checked[uri] = time.monotonic()
+
+        trace = self._current_trace()
+        if trace is not None: start_time = time.perf_counter()
+
+        if uri.lower().endswith('.ycs') and not _is_remote_uri(uri):
+            settings = ycs.load(uri[7:] if uri.startswith('file://') else uri)  # memory mapped, so there is nothing to cache
+            logger.debug('Mapped {} compiled settings from URI <{}>.'.format(len(settings), uri))
+            if trace is not None: trace.resolver, trace.parse_time = 'ycs', time.perf_counter() - start_time
+            return settings
+        #end if
+
+        if self.stream and not _is_remote_uri(uri):
+            path = uri[7:] if uri.startswith('file://') else uri
+            _, ext = os.path.splitext(path[:-3] if path.endswith('.gz') else path)
+            if ext.lower() in STREAMING_EXTENSIONS:
+                settings = load_streaming(path)
+                logger.debug('Loaded {} streaming settings from URI <{}>.'.format(len(settings), uri))
+                if trace is not None: trace.resolver, trace.parse_time = 'stream', time.perf_counter() - start_time
+                return settings
+            #end if
+        #end if
+
+        if self._source_cache is not None:
+            settings = None if fingerprint is None else self._source_cache.get(uri, fingerprint)
+            if settings is not None:
+                logger.debug('Loaded {} settings from cache of URI <{}>.'.format(len(settings), uri))
+                if trace is not None: trace.resolver, trace.read_time = 'cache', time.perf_counter() - start_time
+                return settings
+            #end if
+        #end if
+
+        if trace is not None: trace.resolver, start_time = 'uri', time.perf_counter()
+
+        if _is_http_uri(uri):
+            fingerprint, content = conditional_get(uri)  # its ETag/Last-Modified are used by the conditional GETs of reload()
+            if trace is not None: trace.read_time = time.perf_counter() - start_time
+            self._fingerprints[uri] = fingerprint or _content_digest(uri, content)  # without validators, reload() compares the content itself
+            settings = self._load_settings_from_content(uri, content)
+
+        else:
+            from uriutils import uri_open  # imported on first use, since it imports the SDKs of all supported storages
+
+            _, ext = os.path.splitext(uri)
+            with uri_open(uri, 'rb') as f:
+                if trace is not None: trace.read_time = time.perf_counter() - start_time  # opening includes connecting to remote URIs
+                settings = self._load_settings_from_file(f, ext=ext)
+            #end with
+        #end if
+
+        if fingerprint is not None and self._source_cache is not None: self._source_cache.put(uri, fingerprint, settings)
+
+        logger.debug('Loaded {} settings from URI <{}>.'.format(len(settings), uri))
+        return settings
+    #end def
+
+    def _load_settings_from_content(self, uri, content):
+        """
+        Parses the downloaded ``content`` of ``uri`` according to the extension of its path; gzipped content is decompressed first.
+
+        :returns: a standard :func:`dict` containing the settings from the content
+        :rtype: dict
+        """
+
+        path = urlparse(uri).path
+        if path.endswith('.gz'):
+            import gzip
+
+            content, path = gzip.decompress(content), path[:-3]
+        #end if
+
+        f = BytesIO(content)
+        f.name = uri
+        _, ext = os.path.splitext(path)
+
+        return self._load_settings_from_file(f, ext=ext)
+    #end def
+
+    def _load_settings_from_code(self, source, filename):
+        """
+        Executes the Python ``source`` (:obj:`bytes`) as a new module, without writing it to disk.
+        The compiled code is cached by the hash of ``source`` so repeated loads of the same content skip compilation.
+
+        :returns: the module attributes not starting with ``__``
+        :rtype: dict
+        """
+
+        mod = types.ModuleType('settings_module')
+        mod.__file__ = filename
+        exec(_compile_settings_code(source, filename), mod.__dict__)
+
+        return dict((k, v) for k, v in mod.__dict__.items() if not k.startswith('__'))
+    #end def
+
+    def _load_settings_from_file(self, f, ext=None):
+        if ext is None or ext == '.gz':
+            name = f.name[:-3] if f.name.endswith('.gz') else f.name
+            basename, ext = os.path.splitext(name)
+        #end if
+        ext = ext.lower()
+
+        trace = self._current_trace()
+        if trace is not None:  # read the content up front to time reading and parsing separately
+            start_time = time.perf_counter()
+            content = f.read()
+            trace.read_time, trace.bytes = (trace.read_time or 0.0) + time.perf_counter() - start_time, len(content)
+
+            name, f = f.name, BytesIO(content)
+            f.name = name
+            start_time = time.perf_counter()
+        #end if
+
+        if ext in ['.py']:
+            ext_type = 'Python module'
+            d = self._load_settings_from_code(f.read(), f.name)
+
+        else:
+            parser = get_parser(ext)
+            if parser is None: raise ValueError('Unknown settings file format: {}'.format(ext))
+
+            parse_func, ext_type = parser
+            d = parse_func(f)
+        #end if
+
+        if trace is not None: trace.parse_time = time.perf_counter() - start_time
+
+        if d is None: d = {}
+
+        logger.debug('Loaded {} {} settings from <{}>.'.format(len(d), ext_type, f.name))
+
+        return d
+    #end def
+
+    def get(self, key, *, default=None, cast_func=None, case_sensitive=None, raise_exception=None, warn_missing=None, use_cache=True, additional_sources=[]):
+        """
+        Gets the setting specified by ``key``. For efficiency, we cache the retrieval of settings to avoid multiple searches through the sources list.
+        Values casted by ``cast_func`` are cached as well, so that each ``(key, cast_func)`` pair is only parsed once; cached values are shared between calls and should not be modified.
+
+        :param str key: settings key to retrieve
+        :param str default: use this as default value when the setting key is not found
+        :param func cast_func: cast the value of the settings using this function
+        :param bool case_sensitive: whether to make case sensitive comparisons for settings key
+        :param bool raise_exception: whether to raise a :exc:`MissingSettingException` exception when the setting is not found
+        :param bool warn_missing: whether to display a warning when the setting is not found
+        :param bool use_cache: whether to use (and fill) the cache of raw and casted values
+        :param list additional_sources: additional sources to search for the key after all other sources; file and URI sources are loaded once and kept in a bounded LRU cache (see :meth:`_resolve_additional_source`), and values found in them are never cached for calls without them
+
+        :returns: the setting value
+        :rtype: str
+        """
+
+        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
+        raise_exception = self.raise_exception if raise_exception is None else raise_exception
+        warn_missing = self.warn_missing if warn_missing is None else warn_missing
+
+        if not case_sensitive: key = key.lower()
+
+        snapshot = self._snapshot
+        metrics = self.metrics
+        if use_cache and cast_func is not None:
+            casted = snapshot.cast_cache.get(key)
+            if casted is not None and cast_func in casted:
+                if metrics is not None: metrics.record_cast(key, 0.0, cache_hit=True)
+                return casted[cast_func]
+            #end if
+        #end if
+
+        if snapshot.frozen is not None and case_sensitive == self.case_sensitive and not additional_sources:
+            entry = snapshot.frozen.get(key)
+            found, value = (True, entry[0]) if entry is not None else (False, None)
+            if metrics is not None: metrics.record_lookup(key, True, source=None if entry is None else str(entry[1]))
+
+        elif use_cache and key in snapshot.cache:
+            found, value = True, snapshot.cache[key]
+            if metrics is not None: metrics.record_lookup(key, True)
+
+        elif use_cache and not additional_sources and case_sensitive == self.case_sensitive and key in snapshot.missing and _missing_is_valid(snapshot, key):
+            found, value = False, None
+            if metrics is not None: metrics.record_lookup(key, True)
+
+        else:
+            found, value, source = self._lookup(key, case_sensitive, additional_sources, snapshot=snapshot)
+            if use_cache and found and source not in snapshot.settings: use_cache = False  # found in the additional sources
+            if use_cache:
+                if found: snapshot.cache[key] = value
+                elif case_sensitive == self.case_sensitive: self._cache_missing(snapshot, key)
+            #end if
+            if metrics is not None: metrics.record_lookup(key, False, source=None if source is None else str(source), sources_walked=self._count_walked(snapshot, source, additional_sources))
+        #end if
+
+        if not found:
+            if raise_exception: raise MissingSettingException('The "{}" setting is missing.'.format(key))
+            if warn_missing: warnings.warn('The "{}" setting is missing.'.format(key))
+
+            return default
+        #end if
+
+        if cast_func:
+            if metrics is not None: start_time = time.perf_counter()
+            value = cast_func(value)
+            if metrics is not None: metrics.record_cast(key, time.perf_counter() - start_time)
+            if use_cache: self._cache_casted(snapshot, key, cast_func, value)
+        #end if
+
+        return value
+    #end def
+
+    def get_many(self, keys, *, casts=None, defaults=None, case_sensitive=None, raise_exception=None, warn_missing=None, use_cache=True):
+        """
+        Gets the settings specified by ``keys`` using a single pass over the sources for all keys that are not cached.
+        Unlike :meth:`get`, all missing keys are reported together in one exception or warning.
+
+        :param list keys: settings keys to retrieve
+        :param casts: cast the values of the settings using this function, or a mapping from keys to cast functions; cast functions can also be given by name (``bool``, ``int``, ``float``, ``str``, ``dict``, ``list``, ``uri``, or ``njobs``)
+        :param dict defaults: mapping from keys to default values used when the settings are not found; missing keys default to ``None``
+        :param bool case_sensitive: whether to make case sensitive comparisons for settings key
+        :param bool raise_exception: whether to raise a :exc:`MissingSettingException` exception listing all settings that are not found
+        :param bool warn_missing: whether to display a warning listing all settings that are not found
+        :param bool use_cache: whether to use (and fill) the cache of raw and casted values
+
+        :returns: a mapping from each of ``keys`` to its setting value
+        :rtype: dict
+        """
+
+        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
+        raise_exception = self.raise_exception if raise_exception is None else raise_exception
+        warn_missing = self.warn_missing if warn_missing is None else warn_missing
+        defaults = {} if defaults is None else defaults
+
+        snapshot = self._snapshot
+        metrics = self.metrics
+        use_frozen = snapshot.frozen is not None and case_sensitive == self.case_sensitive
+        cache_missing = case_sensitive == self.case_sensitive
+        values = {}
+        raw_values = {}
+        pending = {}  # normalized keys which are not cached -> requested keys
+
+        for key in keys:
+            normalized_key = key if case_sensitive else key.lower()
+            cast_func = _get_cast_func(casts.get(key) if isinstance(casts, Mapping) else casts)
+
+            if use_cache and cast_func is not None:
+                casted = snapshot.cast_cache.get(normalized_key)
+                if casted is not None and cast_func in casted:
+                    values[key] = casted[cast_func]
+                    if metrics is not None: metrics.record_cast(normalized_key, 0.0, cache_hit=True)
+                    continue
+                #end if
+            #end if
+
+            if use_frozen:
+                entry = snapshot.frozen.get(normalized_key)
+                if entry is not None: raw_values[key] = entry[0]
+                if metrics is not None: metrics.record_lookup(normalized_key, True, source=None if entry is None else str(entry[1]))
+            elif use_cache and normalized_key in snapshot.cache:
+                raw_values[key] = snapshot.cache[normalized_key]
+                if metrics is not None: metrics.record_lookup(normalized_key, True)
+            elif use_cache and cache_missing and normalized_key in snapshot.missing and _missing_is_valid(snapshot, normalized_key):
+                if metrics is not None: metrics.record_lookup(normalized_key, True)
+            else: pending.setdefault(normalized_key, []).append(key)
+        #end for
+
+        if pending and not use_frozen:
+            n_walked = 0
+            for name, settings, key_index in self._iter_sources(snapshot=snapshot):
+                n_walked += 1
+                for normalized_key in list(pending.keys()):
+                    original_key = normalized_key if case_sensitive else key_index.get(normalized_key)
+                    if original_key is None or original_key not in settings: continue
+
+                    value = settings[original_key]
+                    if use_cache: snapshot.cache[normalized_key] = value
+                    for key in pending.pop(normalized_key): raw_values[key] = value
+                    if metrics is not None: metrics.record_lookup(normalized_key, False, source=str(name), sources_walked=n_walked)
+                #end for
+
+                if not pending: break
+            #end for
+
+            if metrics is not None:
+                for normalized_key in pending: metrics.record_lookup(normalized_key, False, sources_walked=n_walked)
+
+            if use_cache and cache_missing:
+                for normalized_key in pending: self._cache_missing(snapshot, normalized_key)
+        #end if
+
+        missing_keys = [key for key in keys if key not in values and key not in raw_values]
+        if missing_keys:
+            message = 'The {} settings are missing.'.format(', '.join('"{}"'.format(key) for key in missing_keys))
+            if raise_exception: raise MissingSettingException(message)
+            if warn_missing: warnings.warn(message)
+
+            for key in missing_keys: values[key] = defaults.get(key)
+        #end if
+
+        for key, value in raw_values.items():
+            cast_func = _get_cast_func(casts.get(key) if isinstance(casts, Mapping) else casts)
+            if cast_func:
+                if metrics is not None: start_time = time.perf_counter()
+                value = cast_func(value)
+                if metrics is not None: metrics.record_cast(key if case_sensitive else key.lower(), time.perf_counter() - start_time)
+                if use_cache: self._cache_casted(snapshot, key if case_sensitive else key.lower(), cast_func, value)
+            #end if
+
+            values[key] = value
+        #end for
+
+        return dict((key, values[key]) for key in keys)
+    #end def
+
+    def get_schema(self, schema, **kwargs):
+        """
+        Gets the settings described by ``schema`` using :meth:`get_many`.
+        See :class:`ycsettings.schema.Schema` for schemas with validation that are compiled into attribute access objects.
+
+        :param dict schema: mapping from settings keys to either a cast function (or its name, see :meth:`get_many`), or a tuple of cast function and default value
+        :returns: a mapping from each key in ``schema`` to its setting value
+        :rtype: dict
+        """
+
+        casts, defaults = {}, {}
+        for key, spec in schema.items():
+            if isinstance(spec, tuple): casts[key], defaults[key] = spec
+            else: casts[key] = spec
+        #end for
+
+        return self.get_many(list(schema.keys()), casts=casts, defaults=defaults, **kwargs)
+    #end def
+
+    def _cache_casted(self, snapshot, key, cast_func, value):
+        """
+        Caches the ``value`` of ``key`` casted by ``cast_func`` in ``snapshot``; see :func:`_add_casted`.
+        """
+
+        _add_casted(snapshot.cast_cache, key, cast_func, value)
+
+    def _cache_missing(self, snapshot, key):
+        """
+        Remembers that ``key`` is not in any source of ``snapshot``, so that repeated lookups of optional settings do not search all sources again.
+        When the snapshot has an environment source, which is live, the entry is only valid while the number of environment variables is unchanged and no variable is named like the key (see :func:`_missing_is_valid`); new sources replace the snapshot (see :meth:`reload`), which discards the entries.
+        The number of entries is bounded by dropping all of them when it is reached.
+        """
+
+        missing = snapshot.missing
+        if len(missing) >= _MAX_MISSING_KEYS: snapshot.missing = missing = {}
+
+        missing[key] = len(os.environ)
+    #end def
+
+    def _lookup(self, key, case_sensitive, additional_sources=[], snapshot=None):
+        """
+        Searches the sources in priority order for ``key``, which should already be lowercased for case insensitive lookups.
+
+        :returns: a tuple of whether ``key`` is found, its value, and the name of the source it was found in
+        """
+
+        for name, settings, key_index in self._iter_sources(additional_sources, snapshot=snapshot):
+            if case_sensitive:
+                if key in settings: return True, settings[key], name
+            else:
+                original_key = key_index.get(key)
+                if original_key is not None: return True, settings[original_key], name
+            #end if
+        #end for
+
+        return False, None, None
+    #end def
+
+    def _count_walked(self, snapshot, source, additional_sources=[]):
+        """Returns the number of sources searched by a lookup that was answered by ``source`` (or that missed, when ``source`` is ``None``), for :class:`~ycsettings.metrics.SettingsMetrics`."""
+
+        if source is not None and source in snapshot.settings: return list(snapshot.settings.keys()).index(source) + 1
+
+        return len(snapshot.settings) + len(additional_sources)
+    #end def
+
+    def _iter_sources(self, additional_sources=[], snapshot=None):
+        """
+        Iterates through the sources of ``snapshot`` (defaults to the current one) in priority order, followed by ``additional_sources``.
+
+        :returns: tuples of source name, settings, and the case insensitive key index of the source
+        """
+
+        if snapshot is None: snapshot = self._snapshot
+        for name, settings in snapshot.settings.items():
+            if isinstance(settings, _DeferredSource): settings = self._load_deferred(snapshot, name)
+            yield name, settings, snapshot.key_indexes[name]
+        #end for
+
+        for source in additional_sources:
+            yield from self._resolve_additional_source(source)
+    #end def
+
+    def _resolve_additional_source(self, source):
+        """
+        Loads a source given as ``additional_sources`` to :meth:`get`.
+        File, URI, and module sources (given as :obj:`str` or :class:`~urllib.parse.ParseResult`) are kept in a bounded LRU cache keyed by their URI, together with the fingerprints of their files and URIs, so that request-scoped sources are not read and parsed on every call; :meth:`reload` discards the entries whose fingerprints changed.
+        Other sources (i.e., :func:`dict` objects) are used as they are.
+
+        :returns: a list of tuples of source name, settings, and the case insensitive key index of the source
+        :rtype: list
+        """
+
+        cache_key = source.geturl() if isinstance(source, ParseResult) else (source if isinstance(source, str) else None)
+        if cache_key is not None:
+            with self._additional_sources_lock:
+                entry = self._additional_sources.get(cache_key)
+                if entry is not None:
+                    self._additional_sources.move_to_end(cache_key)
+                    return entry[0]
+                #end if
+            #end with
+        #end if
+
+        resolved = []
+        for name, settings in self._load_settings_from_source(source):
+            if isinstance(settings, _DeferredSource): settings = settings.load()
+            if not settings: continue
+            resolved.append((name, settings, self._build_key_index(name, settings)))
+        #end for
+
+        if cache_key is not None:
+            uris = [name.geturl() if isinstance(name, ParseResult) else name for name, _, _ in resolved]
+            fingerprints = [(uri, self._fingerprints[uri]) for uri in uris if isinstance(uri, str) and uri in self._fingerprints]
+            with self._additional_sources_lock:
+                self._additional_sources[cache_key] = (resolved, fingerprints)
+                while len(self._additional_sources) > _MAX_ADDITIONAL_SOURCES: self._additional_sources.popitem(last=False)
+            #end with
+        #end if
+
+        return resolved
+    #end def
+
+    def _invalidate_additional_sources(self, force=False):
+        """
+        Discards the cached ``additional_sources`` (see :meth:`_resolve_additional_source`) whose files or URIs have a different fingerprint now, or all of them if ``force`` is set.
+        Like the other sources, files and URIs are not checked again until their ``refresh_ttl`` expires, and sources that cannot be fingerprinted are discarded.
+        """
+
+        with self._additional_sources_lock:
+            if force:
+                self._additional_sources.clear()
+                return
+            #end if
+
+            entries = list(self._additional_sources.items())
+        #end with
+
+        changed = []
+        for cache_key, entry in entries:
+            for uri, fingerprint in entry[1]:
+                ttl = self._get_refresh_ttl(uri)
+                if ttl and time.monotonic() - self._last_checked.get(uri, 0.0) < ttl: continue
+
+                self._last_checked[uri] = time.monotonic()
+                current = source_fingerprint(uri)
+                if current is None or current != fingerprint:
+                    changed.append((cache_key, entry))
+                    break
+                #end if
+            #end for
+        #end for
+
+        if not changed: return
+
+        with self._additional_sources_lock:
+            for cache_key, entry in changed:
+                if self._additional_sources.get(cache_key) is entry: del self._additional_sources[cache_key]
+        #end with
+
+        logger.debug('Discarded {} changed additional settings sources.'.format(len(changed)))
+    #end def
+
+    def getbool(self, key, **kwargs):
+        """
+        Gets the setting value as a :func:`bool` by cleverly recognizing true values.
+
+        :rtype: bool
+        """
+
+        return self.get(key, cast_func=_string_to_bool, **kwargs)
+    #end def
+
+    def getint(self, key, **kwargs):
+        """
+        Gets the setting value as a :obj:`int`.
+
+        :rtype: int
+        """
+
+        return self.get(key, cast_func=int, **kwargs)
+    #end def
+
+    def getfloat(self, key, **kwargs):
+        """
+        Gets the setting value as a :obj:`float`.
+
+        :rtype: float
+        """
+
+        return self.get(key, cast_func=float, **kwargs)
+    #end def
+
+    def getdict(self, key, **kwargs):
+        """
+        Gets the setting value as a :obj:`dict`.
+
+        :rtype: dict
+        """
+
+        return self.getserialized(key, **kwargs)
+    #end def
+
+    def getserialized(self, key, decoder_func=None, copy=False, **kwargs):
+        """
+        Gets the setting value as a :obj:`dict` or :obj:`list` trying :meth:`json.loads`, followed by :meth:`yaml.load`.
+        The parsed value is cached and shared between calls, so it is read-only: its dictionaries and lists (including nested ones) raise :exc:`TypeError` when modified.
+
+        :param func decoder_func: decode the value using this function instead of JSON or YAML
+        :param bool copy: whether to return a mutable deep copy of the cached value
+        :rtype: dict, list
+        """
+
+        default = kwargs.pop('default', None)
+        cast_func = _serialized_caster(decoder_func)
+
+        try:
+            value = self.get(key, default=_MISSING, cast_func=cast_func, **kwargs)
+            if value is _MISSING: return cast_func(default)
+        except _DeserializationError:
+            raise ValueError('Unable to parse {} setting using JSON or YAML.'.format(key)) from None
+
+        return deepcopy(value) if copy else value
+    #end def
+
+    def geturi(self, key, **kwargs):
+        """
+        Gets the setting value as a :class:`urllib.parse.ParseResult`.
+
+        :rtype: urllib.parse.ParseResult
+        """
+
+        return self.get(key, cast_func=urlparse, **kwargs)
+    #end def
+
+    def getlist(self, key, delimiter=',', copy=False, **kwargs):
+        """
+        Gets the setting value as a :class:`list`; it splits the string using ``delimiter``.
+        Like :meth:`getserialized`, the cached list is shared between calls and read-only.
+
+        :param str delimiter: split the value using this delimiter
+        :param bool copy: whether to return a mutable deep copy of the cached list
+        :rtype: list
+        """
+
+        default = kwargs.pop('default', None)
+        cast_func = _list_caster(delimiter)
+
+        try:
+            value = self.get(key, default=_MISSING, cast_func=cast_func, **kwargs)
+            if value is _MISSING: return cast_func(default)
+        except _DeserializationError:
+            raise ValueError('Unable to parse {} setting using JSON or YAML.'.format(key)) from None
+
+        return deepcopy(value) if copy else value
+    #end def
+
+    def getnjobs(self, key, **kwargs):
+        """
+        Gets the setting value as an integer relative to the number of CPU.
+        See :func:`ycsettings.settings.parse_n_jobs` for parsing rules.
+
+        :rtype: int
+        """
+
+        return self.get(key, cast_func=parse_n_jobs, **kwargs)
+    #end def
+
+    def _search_environ(self, key, default=None):
+        k = _ENVIRON.find_key(key.lower())
+        if k is None: return default
+
+        return os.environ.get(k, default)
+    #end def
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __contains__(self, key):
+        if not self.case_sensitive and isinstance(key, str): key = key.lower()
+
+        snapshot = self._snapshot
+        if snapshot.frozen is not None: return key in snapshot.frozen
+        if key in snapshot.cache: return True
+        if key in snapshot.missing and _missing_is_valid(snapshot, key): return False
+
+        found = self._lookup(key, self.case_sensitive, snapshot=snapshot)[0]
+        if not found: self._cache_missing(snapshot, key)
+
+        return found
+    #end def
+
+    def __iter__(self):
+        return iter(self._get_union_keys(self._snapshot))
+
+    def __len__(self):
+        return len(self._get_union_keys(self._snapshot))
+
+    def _get_union_keys(self, snapshot):
+        """
+        Returns the union of keys of all sources in ``snapshot`` in priority order.
+        The list is built completely before it is published, so a partially consumed iterator never leaves a truncated list behind.
+
+        :rtype: list
+        """
+
+        union_keys = snapshot.union_keys
+        if union_keys is not None: return union_keys
+
+        keys = set()
+        union_keys = []
+        for source, settings, _ in self._iter_sources(snapshot=snapshot):
+            for k in settings.keys():
+                if not self.case_sensitive and isinstance(k, str): k = k.lower()
+                if k in keys: continue
+
+                keys.add(k)
+                union_keys.append(k)
+            #end for
+        #end for
+
+        snapshot.union_keys = union_keys
+
+        return union_keys
+    #end def
+#end class
+
+
+class _SettingsOverlay(Settings):
+    """
+    The view returned by :meth:`Settings.with_overrides`; it looks up overridden keys itself and delegates everything else to its parent.
+    It does not call :meth:`Settings.__init__`; attributes that it does not set itself (i.e., :attr:`source_traces`, :attr:`refresh_ttl`, or :attr:`stream`) are read from the parent.
+    """
+
+    def __init__(self, parent, overrides):
+        self.parent = parent
+        self.case_sensitive = parent.case_sensitive
+        self.raise_exception = parent.raise_exception
+        self.warn_missing = parent.warn_missing
+        self.metrics = parent.metrics
+
+        self._overrides = overrides
+        self._override_index = parent._build_key_index('overrides', overrides)
+        self._cast_cache = {}  # normalized key -> cast function -> casted value of overrides
+    #end def
+
+    def __getattr__(self, name):
+        if name == 'parent': raise AttributeError(name)  # i.e., while unpickling
+        return getattr(self.parent, name)
+    #end def
+
+    def _find_override(self, key, case_sensitive):
+        """Returns the key in the overrides matching ``key`` (lowercased for case insensitive lookups), or ``None``."""
+
+        if case_sensitive: return key if key in self._overrides else None
+        return self._override_index.get(key)
+    #end def
+
+    def get(self, key, *, default=None, cast_func=None, case_sensitive=None, use_cache=True, **kwargs):
+        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
+        normalized_key = key if case_sensitive else key.lower()
+
+        override_key = self._find_override(normalized_key, case_sensitive)
+        if override_key is None: return self.parent.get(key, default=default, cast_func=cast_func, case_sensitive=case_sensitive, use_cache=use_cache, **kwargs)
+
+        value = self._overrides[override_key]
+        if cast_func:
+            casted = self._cast_cache.get(normalized_key)
+            if use_cache and casted is not None and cast_func in casted: return casted[cast_func]
+
+            value = cast_func(value)
+            if use_cache: _add_casted(self._cast_cache, normalized_key, cast_func, value)
+        #end if
+
+        return value
+    #end def
+
+    async def aget(self, key, **kwargs):
+        case_sensitive = kwargs.get('case_sensitive')
+        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
+        if self._find_override(key if case_sensitive else key.lower(), case_sensitive) is not None: return self.get(key, **kwargs)
+
+        return await self.parent.aget(key, **kwargs)
+    #end def
+
+    def get_many(self, keys, *, casts=None, defaults=None, case_sensitive=None, **kwargs):
+        case_sensitive = self.case_sensitive if case_sensitive is None else case_sensitive
+
+        overridden = set(key for key in keys if self._find_override(key if case_sensitive else key.lower(), case_sensitive) is not None)
+        values = self.parent.get_many([key for key in keys if key not in overridden], casts=casts, defaults=defaults, case_sensitive=case_sensitive, **kwargs) if len(overridden) < len(keys) else {}
+        for key in overridden:
+            values[key] = self.get(key, cast_func=_get_cast_func(casts.get(key) if isinstance(casts, Mapping) else casts), case_sensitive=case_sensitive)
+
+        return dict((key, values[key]) for key in keys)
+    #end def
+
+    def __contains__(self, key):
+        normalized_key = key.lower() if not self.case_sensitive and isinstance(key, str) else key
+        return self._find_override(normalized_key, self.case_sensitive) is not None or key in self.parent
+    #end def
+
+    def __iter__(self):
+        keys = [k.lower() if not self.case_sensitive and isinstance(k, str) else k for k in self._overrides.keys()]
+        seen = set(keys)
+
+        return chain(keys, (k for k in self.parent if k not in seen))
+    #end def
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def reload(self, force=False):
+        return self.parent.reload(force=force)
+
+    def on_change(self, key, callback):
+        return self.parent.on_change(key, callback)
+
+    def watch(self, interval=1.0):
+        return self.parent.watch(interval)
+
+    def stop_watching(self):
+        return self.parent.stop_watching()
+#end class
+
+
+class MissingSettingException(Exception):
+    pass
+
+
+class _EnvironSource(Mapping):
+    """
+    A live, read-only view of :attr:`os.environ`, optionally restricted to variables whose names start with ``prefix``.
+    Values are always read from :attr:`os.environ`; the lowercase index of (matching) variable names is rebuilt when the number of environment variables changes, or when a lookup finds a variable that the index does not know about.
+    Lookups that miss the index probe the lowercase and uppercase spellings of the key directly, so that a variable replaced by another one (keeping the number of variables unchanged) is found in constant time; variables with other mixed case spellings are only found once the number of variables changes.
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix
+        self.key_index = _EnvironKeyIndex(self)
+        self._state = (-1, None)
+    #end def
+
+    def _get_index(self):
+        size, index = self._state
+        if index is None or size != len(os.environ): index = self._build_index()
+
+        return index
+    #end def
+
+    def _build_index(self):
+        index = {}
+        size = len(os.environ)
+        for k in self._iter_environ():
+            index.setdefault(k.lower(), k)
+
+        self._state = (size, index)
+        logger.debug('Indexed {} environment variables.'.format(len(index)))
+
+        return index
+    #end def
+
+    def _iter_environ(self):
+        if self.prefix: return iter([k for k in os.environ.keys() if k.startswith(self.prefix)])  # only copies the matching names
+        return iter(list(os.environ.keys()))
+    #end def
+
+    def find_key(self, lower_key):
+        """
+        :returns: the name of the environment variable matching ``lower_key`` case insensitively, or ``None``
+        """
+
+        k = self._get_index().get(lower_key)
+        if k is not None:
+            if k in os.environ: return k
+            return self._build_index().get(lower_key)  # the variable disappeared
+        #end if
+
+        for k in (lower_key, lower_key.upper()):
+            if k in self: return self._build_index().get(lower_key, k)  # the variable is newer than the index
+
+        return None
+    #end def
+
+    def __getitem__(self, key):
+        if self.prefix and not key.startswith(self.prefix): raise KeyError(key)
+        return os.environ[key]
+    #end def
+
+    def __contains__(self, key):
+        if not isinstance(key, str) or (self.prefix and not key.startswith(self.prefix)): return False
+        return key in os.environ
+    #end def
+
+    def __iter__(self):
+        return self._iter_environ()
+
+    def __len__(self):
+        return sum(1 for _ in self._iter_environ()) if self.prefix else len(os.environ)
+#end class
+
+
+class _EnvironKeyIndex(object):
+    """The case insensitive key index of an :class:`_EnvironSource`, which stays consistent with :attr:`os.environ`."""
+
+    __slots__ = ('source',)
+
+    def __init__(self, source):
+        self.source = source
+
+    def get(self, lower_key, default=None):
+        k = self.source.find_key(lower_key)
+        return default if k is None else k
+    #end def
+#end class
+
+
+def _add_casted(cast_cache, key, cast_func, value):
+    """
+    Adds the ``value`` of ``key`` casted by ``cast_func`` to ``cast_cache``.
+    We only keep a handful of casted values per key so that ad hoc cast functions (i.e., lambdas) do not grow the cache without bounds.
+    """
+
+    casted = cast_cache.get(key)
+    if casted is None or len(casted) >= _MAX_CASTS_PER_KEY:
+        casted = cast_cache[key] = {}
+
+    casted[cast_func] = value
+#end def
+
+
+def _missing_is_valid(snapshot, key):
+    """
+    Checks whether the cached miss of ``key`` in ``snapshot`` still holds in constant time.
+    Without an environment source, it holds until the snapshot is replaced; otherwise, the number of environment variables must be unchanged and there must be no variable named like the key (in lowercase or uppercase), which catches variables that replaced others.
+    """
+
+    has_environ = snapshot.has_environ
+    if has_environ is None: has_environ = snapshot.has_environ = any(isinstance(settings, _EnvironSource) for settings in snapshot.settings.values())
+    if not has_environ: return True
+
+    if snapshot.missing.get(key) != len(os.environ): return False
+
+    return not isinstance(key, str) or (key not in os.environ and key.upper() not in os.environ)
+#end def
+
+
+_ENVIRON = _EnvironSource()
+
+
+class _Snapshot(object):
+    """
+    The loaded sources of a :class:`Settings` object, together with the lookup structures and caches built from them.
+    :meth:`Settings.reload` never modifies the current snapshot; it builds a new one and swaps it in with a single assignment.
+    """
+
+    __slots__ = ('settings', 'key_indexes', 'cache', 'cast_cache', 'missing', 'union_keys', 'frozen', 'load_lock', 'has_environ')
+
+    def __init__(self, settings=None, key_indexes=None):
+        self.settings = OrderedDict() if settings is None else settings
+        self.key_indexes = {} if key_indexes is None else key_indexes
+        self.cache = {}
+        self.cast_cache = {}
+        self.missing = {}  # keys not found in any source -> number of environment variables at the time
+        self.union_keys = None
+        self.frozen = None
+        self.load_lock = Lock()
+        self.has_environ = None  # whether there is an environment source; computed on first use by _missing_is_valid()
+    #end def
+#end class
+
+
+class _DeferredSource(object):
+    """
+    Placeholder in the priority list for a source that is only loaded when a lookup falls through to it (see ``lazy`` in :class:`Settings`).
+    """
+
+    __slots__ = ('load_func', 'source')
+
+    def __init__(self, load_func, source):
+        self.load_func = load_func
+        self.source = source
+    #end def
+
+    def load(self):
+        return self.load_func(self.source)
+#end class
+
+
+class _DeserializationError(ValueError):
+    pass
+
+
+_MISSING = object()
+_MAX_CASTS_PER_KEY = 8
+_MAX_MISSING_KEYS = 4096
+_MAX_ADDITIONAL_SOURCES = 32
+_MAX_COMPILED_CODE = 64
+_compiled_code = {}
+
+
+def _string_to_bool(s):
+    if isinstance(s, str):
+        if s.strip().lower() in ('true', 't', '1'): return True
+        elif s.strip().lower() in ('false', 'f', '0', 'None', 'null', ''): return False
+
+        raise ValueError('Unable to get boolean value of "{}".'.format(s))
+    #end if
+
+    return bool(s)
+#end def
+
+
+def _deserialize(value, decoder_func=None):
+    if isinstance(value, (dict, list, tuple)) or value is None:
+        return value
+
+    if decoder_func: return decoder_func(value)
+
+    try:
+        o = json_loads(value)
+        return o
+    except ValueError: pass
+
+    try:
+        o = yaml_load(value)
+        return o
+    except ImportError: raise
+    except Exception as e:
+        from yaml.parser import ParserError  # PyYAML is already imported by yaml_load
+
+        if not isinstance(e, ParserError): raise
+    #end try
+
+    raise _DeserializationError('Unable to parse "{}" using JSON or YAML.'.format(value))
+#end def
+
+
+def _to_list(value, delimiter=','):
+    if value is None: return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('[') and value.endswith(']'):
+            return _deserialize(value)
+
+        return [p.strip(' ') for p in value.split(delimiter)]
+    #end if
+
+    return list(value)
+#end def
+
+
+@lru_cache(maxsize=1024)
+def _classify_string_source(source):
+    """
+    Classifies a string source by its syntax alone: strings with a scheme, drive, or path separator, and strings that are not dotted Python names are ``uri``; the rest are ``module`` (but may still be file names, see :func:`_has_settings_extension`).
+    """
+
+    if ':' in source or '/' in source or '\\' in source: return 'uri'
+    if all(part.isidentifier() for part in source.split('.')): return 'module'
+
+    return 'uri'
+#end def
+
+
+def _has_settings_extension(source):
+    _, ext = os.path.splitext(source[:-3] if source.endswith('.gz') else source)
+    ext = ext.lower()
+
+    return ext in ('.py', '.ycs') or ext in STREAMING_EXTENSIONS or get_parser(ext) is not None
+#end def
+
+
+def _is_remote_uri(source):
+    if isinstance(source, ParseResult): return source.scheme not in ('', 'file')
+    if isinstance(source, str): return '://' in source and not source.startswith('file://')
+
+    return False
+#end def
+
+
+def _is_http_uri(uri):
+    return uri[:8].lower().startswith(('http://', 'https://'))
+
+
+def _content_digest(uri, content):
+    """Returns the fingerprint of downloaded ``content`` whose server sent neither ``ETag`` nor ``Last-Modified``."""
+
+    import hashlib
+
+    return ('digest', uri, hashlib.sha1(content).hexdigest())
+#end def
+
+
+def _compile_settings_code(source, filename):
+    """
+    Compiles the Python settings ``source``; code objects are cached by ``(content hash, filename)``.
+    """
+
+    import hashlib
+
+    cache_key = (hashlib.sha256(source).digest(), filename)
+    code = _compiled_code.get(cache_key)
+    if code is None:
+        code = compile(source, filename, 'exec', dont_inherit=True)
+        if len(_compiled_code) >= _MAX_COMPILED_CODE: _compiled_code.clear()
+        _compiled_code[cache_key] = code
+    #end if
+
+    return code
+#end def
+
+
+def _get_cast_func(cast):
+    if isinstance(cast, str):
+        try: return _NAMED_CASTS[cast]
+        except KeyError: raise ValueError('Unknown cast function "{}".'.format(cast))
+    #end if
+
+    return cast
+#end def
+
+
+def _read_only_cast(value, cast_func):
+    return _freeze_value(cast_func(value))
+
+
+@lru_cache(maxsize=128)
+def _serialized_caster(decoder_func=None):
+    """Returns the same cast function for the same ``decoder_func`` so that casted values can be cached; casted values are read-only."""
+    return partial(_read_only_cast, cast_func=_deserialize if decoder_func is None else partial(_deserialize, decoder_func=decoder_func))
+
+
+@lru_cache(maxsize=128)
+def _list_caster(delimiter=','):
+    """Returns the same cast function for the same ``delimiter`` so that casted values can be cached; casted values are read-only."""
+    return partial(_read_only_cast, cast_func=partial(_to_list, delimiter=delimiter))
+
+
+def _freeze_value(value):
+    """
+    Returns a read-only copy of ``value`` in which dictionaries and lists (recursively) are replaced by :class:`_ReadOnlyDict` and :class:`_ReadOnlyList`, so that cached values cannot be modified by callers.
+    """
+
+    if isinstance(value, dict): return _ReadOnlyDict((k, _freeze_value(v)) for k, v in value.items())
+    if isinstance(value, list): return _ReadOnlyList(_freeze_value(v) for v in value)
+    if isinstance(value, tuple): return tuple(_freeze_value(v) for v in value)
+
+    return value
+#end def
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError('Cached settings values are read-only; use copy=True to get a mutable copy.')
+
+
+class _ReadOnlyDict(dict):
+    """A :obj:`dict` that cannot be modified; it is still a :obj:`dict` for :func:`isinstance`, comparisons, and serialization, and copies of it are plain :obj:`dict` objects."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+#end class
+
+
+class _ReadOnlyList(list):
+    """A :obj:`list` that cannot be modified; copies of it are plain :obj:`list` objects."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def __reduce__(self):
+        return (list, (list(self),))
+#end class
+
+
+def parse_n_jobs(s):
+    """
+    This function parses a "math"-like string as a function of CPU count.
+    It is useful for specifying the number of jobs.
+
+    For example, on an 8-core machine::
+
+        assert parse_n_jobs('0.5 * n') == 4
         assert parse_n_jobs('2n') == 16
         assert parse_n_jobs('n') == 8
         assert parse_n_jobs('4') == 4
@@ -469,7 +1829,7 @@ def parse_n_jobs(s):
     """
 
     n_jobs = None
-    N = cpu_count()
+    N = os.cpu_count() or 1
 
     if isinstance(s, int): n_jobs = s
 
@@ -494,3 +1854,15 @@ def parse_n_jobs(s):
 
     return int(n_jobs)
 #end def
+
+
+_NAMED_CASTS = {
+    'bool': _string_to_bool,
+    'int': int,
+    'float': float,
+    'str': str,
+    'dict': _serialized_caster(),
+    'list': _list_caster(),
+    'uri': urlparse,
+    'njobs': parse_n_jobs,
+}
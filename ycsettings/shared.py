@@ -0,0 +1,91 @@
+"""
+This module contains shared memory snapshots of resolved settings for multi-process worker pools.
+
+:func:`share` (or :meth:`Settings.share`) publishes the resolved settings in the ``.ycs`` format (see :mod:`ycsettings.ycs`) into a :class:`multiprocessing.shared_memory.SharedMemory` block.
+Worker processes attach to the block by name with :class:`SharedSettings`, so they map the same pages instead of unpickling or rebuilding the settings, and all of them see the same snapshot.
+:class:`SharedSettings` objects are pickled by the name of the block, so they are cheap to pass to workers, i.e., as arguments of :meth:`multiprocessing.pool.Pool.map`.
+
+.. code-block:: python
+
+    settings = Settings('settings.yaml')
+    shm = settings.share()
+    try:
+        with Pool(settings.getnjobs('n_jobs')) as pool:
+            pool.map(work, [(SharedSettings(shm.name), item) for item in items])
+    finally:
+        shm.close()
+        shm.unlink()
+"""
+
+__all__ = ['SharedSettings', 'share']
+
+
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+
+from . import ycs
+from .settings import Settings
+
+
+def share(settings, name=None):
+    """
+    Publishes the resolved ``settings`` into a new shared memory block.
+    The block outlives this process until it is unlinked, so keep the returned object and call its ``close`` and ``unlink`` methods when the workers are done.
+
+    :param Settings settings: settings to publish; all keys must be strings and all values must be picklable
+    :param str name: name of the shared memory block; defaults to a random name
+    :rtype: multiprocessing.shared_memory.SharedMemory
+    """
+
+    data = ycs.dumps(dict((k, settings.get(k)) for k in settings))
+    shm = SharedMemory(name=name, create=True, size=len(data))
+    shm.buf[:len(data)] = data
+
+    return shm
+#end def
+
+
+def _attach_shared_memory(name):
+    # Before Python 3.13, attaching also registers the block with the resource tracker; worker processes share the tracker of the process that published the block, so this is harmless for them.
+    try: return SharedMemory(name=name, track=False)
+    except TypeError: return SharedMemory(name=name)
+#end def
+
+
+class SharedSettings(Settings):
+    """
+    A read-only view of settings published with :func:`share`.
+    The view only contains the shared snapshot (``search_first`` is empty), and values are decoded on lookup.
+    """
+
+    def __init__(self, name, **kwargs):
+        """
+        :param str name: name of the shared memory block
+        :param kwargs: other keyword arguments of :class:`Settings`, i.e., ``case_sensitive`` or ``frozen``
+        """
+
+        self.shared_name = name
+        self._attach_kwargs = kwargs
+        self._shm = _attach_shared_memory(name)
+        self._shared_settings = ycs.YCSSettings(self._shm.buf, name=name)
+
+        super(SharedSettings, self).__init__(self._shared_settings, search_first=[], dict_settings_uri_keys=[], **kwargs)
+    #end def
+
+    def __reduce__(self):
+        return (partial(SharedSettings, **self._attach_kwargs), (self.shared_name,))
+
+    def close(self):
+        """Detaches from the shared memory block; the view can no longer be used afterwards."""
+
+        if self._shm is None: return
+
+        self._shared_settings.close()
+        self._shm.close()
+        self._shm = None
+    #end def
+
+    def __del__(self):
+        if getattr(self, '_shm', None) is not None: self.close()
+    #end def
+#end class
@@ -0,0 +1,288 @@
+"""
+This module contains streaming loaders for very large JSON, JSON lines, and YAML settings files.
+
+Instead of parsing the whole document, the file is scanned in fixed size chunks to build an index of its top level keys and the byte ranges of their values.
+Values are only parsed when they are accessed, so memory usage is bounded by the size of the index (and of the values that are actually used), not by the size of the file.
+Gzipped files are decompressed in a streaming fashion into an anonymous temporary file, which is then indexed the same way.
+"""
+
+__all__ = ['StreamingSettings', 'load_streaming', 'STREAMING_EXTENSIONS']
+
+
+from collections.abc import Mapping
+import logging
+import os
+import re
+from threading import Lock
+
+from .parsers import json_loads, yaml_load
+
+
+logger = logging.getLogger(__name__)
+
+STREAMING_EXTENSIONS = {'.json': 'json', '.js': 'json', '.jsonl': 'json', '.ndjson': 'json', '.yaml': 'yaml'}
+"""File extensions supported by :func:`load_streaming` and their formats."""
+
+CHUNK_SIZE = 1 << 20
+
+_STRING_SPECIAL_RE = re.compile(rb'["\\]')
+_STRUCTURAL_RE = re.compile(rb'[{}\[\]",:]')
+_YAML_KEY_RE = re.compile(r'''^("(?:[^"\\]|\\.)*"|'(?:[^']|'')*'|[^\s#'"?\-\[\]{}|>!&*%@`][^#]*?|-[^\s#][^#]*?)\s*:(?:\s|$)''')
+_YAML_ANCHOR_RE = re.compile(rb'(?:^|[\s\[{,])[&*][^\s\[\]{},]')  # anchors (&name) and aliases (*name); may also match inside quoted strings, which is harmless
+
+
+class StreamingSettings(Mapping):
+    """
+    A read-only mapping of the top level settings of a large file, whose values are parsed on access.
+    Values are read with :func:`os.pread` when available, so lookups from multiple threads do not need to share a file position.
+    """
+
+    def __init__(self, f, index, loads, name=None):
+        """
+        :param f: binary file object opened for reading; it is owned (and closed) by this object
+        :param dict index: mapping from keys to tuples of byte offset and length of their values
+        :param func loads: function that parses the bytes of a value
+        :param str name: name of the source, used in log messages
+        """
+
+        self._f = f
+        self._index = index
+        self._loads = loads
+        self._lock = Lock()
+        self.name = name or getattr(f, 'name', None)
+    #end def
+
+    def _read(self, offset, length):
+        if hasattr(os, 'pread'): return os.pread(self._f.fileno(), length, offset)
+
+        with self._lock:
+            self._f.seek(offset)
+            return self._f.read(length)
+        #end with
+    #end def
+
+    def __getitem__(self, key):
+        offset, length = self._index[key]
+        return self._loads(key, self._read(offset, length))
+    #end def
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        self._f.close()
+
+    def __del__(self):
+        f = getattr(self, '_f', None)
+        if f is not None: f.close()
+    #end def
+#end class
+
+
+def load_streaming(path, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    Indexes the settings file at ``path`` without parsing its values.
+    JSON files may contain one or more top level objects (i.e., JSON lines), whose keys are merged with later keys taking precedence.
+    YAML files must be a block mapping with top level keys starting at the first column, without anchors and aliases; other YAML documents are parsed completely.
+
+    :param str path: path to a local (optionally gzipped) settings file
+    :param str fmt: either ``json`` or ``yaml``; defaults to the format of the file extension (see :data:`STREAMING_EXTENSIONS`)
+    :param int chunk_size: number of bytes to read at a time
+    :returns: a :class:`StreamingSettings`, or a :func:`dict` when the file had to be parsed completely
+    """
+
+    compressed = path.endswith('.gz')
+    if fmt is None:
+        _, ext = os.path.splitext(path[:-3] if compressed else path)
+        fmt = STREAMING_EXTENSIONS[ext.lower()]
+    #end if
+
+    if compressed:
+        import gzip
+        import shutil
+        from tempfile import TemporaryFile
+
+        f = TemporaryFile()
+        with gzip.open(path, 'rb') as g: shutil.copyfileobj(g, f, chunk_size)
+        f.seek(0)
+    else: f = open(path, 'rb')
+
+    try:
+        if fmt == 'json':
+            index = _index_json(f, chunk_size)
+            settings = StreamingSettings(f, index, _loads_json_value, name=path)
+
+        else:
+            index = _index_yaml(f)
+            if index is None:
+                logger.debug('<{}> is not a block mapping or uses anchors; parsing it completely.'.format(path))
+                f.seek(0)
+                try: return yaml_load(f.read()) or {}
+                finally: f.close()
+            #end if
+
+            settings = StreamingSettings(f, index, _loads_yaml_value, name=path)
+        #end if
+
+    except Exception:
+        f.close()
+        raise
+    #end try
+
+    logger.debug('Indexed {} top level settings in <{}>.'.format(len(index), path))
+
+    return settings
+#end def
+
+
+def _loads_json_value(key, data): return json_loads(data)
+
+
+def _loads_yaml_value(key, data):
+    d = yaml_load(data)
+    if not isinstance(d, dict) or len(d) != 1: raise ValueError('Unable to parse the value of "{}" on its own.'.format(key))
+
+    return next(iter(d.values()))
+#end def
+
+
+def _index_json(f, chunk_size=CHUNK_SIZE):
+    """
+    Scans the JSON objects in ``f`` for their top level keys.
+
+    :returns: a mapping from keys to tuples of byte offset and length of their (unparsed) values
+    :rtype: dict
+    """
+
+    index = {}
+    depth, in_string, escape = 0, False, False
+    expecting = None  # within a top level object: key, colon, or value
+    key_start, key_prefix, value_start = None, b'', None
+    base = 0
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk: break
+
+        i, n = 0, len(chunk)
+        while i < n:
+            if in_string:
+                if escape:
+                    escape = False
+                    i += 1
+                    continue
+                #end if
+
+                m = _STRING_SPECIAL_RE.search(chunk, i)
+                if m is None: break
+
+                j = m.start()
+                if chunk[j] == 0x5c:  # backslash
+                    escape = True
+                    i = j + 1
+                    continue
+                #end if
+
+                in_string = False
+                if key_start is not None:
+                    key = json_loads(key_prefix + chunk[max(key_start - base, 0):j + 1])
+                    key_start, key_prefix, expecting = None, b'', 'colon'
+                #end if
+
+                i = j + 1
+                continue
+            #end if
+
+            m = _STRUCTURAL_RE.search(chunk, i)
+            if m is None: break
+
+            j = m.start()
+            c = chunk[j]
+            if c == 0x22:  # quote
+                in_string = True
+                if depth == 1 and expecting == 'key': key_start = base + j
+
+            elif c == 0x7b or c == 0x5b:  # { or [
+                if depth == 0:
+                    if c == 0x5b: raise ValueError('Top level JSON values must be objects.')
+                    expecting = 'key'
+                #end if
+                depth += 1
+
+            elif c == 0x7d or c == 0x5d:  # } or ]
+                if depth == 1 and expecting == 'value': index[key] = (value_start, base + j - value_start)
+                depth -= 1
+                if depth == 0: expecting = None
+
+            elif depth == 1:
+                if c == 0x3a and expecting == 'colon':  # :
+                    expecting, value_start = 'value', base + j + 1
+                elif c == 0x2c and expecting == 'value':  # ,
+                    index[key] = (value_start, base + j - value_start)
+                    expecting = 'key'
+                #end if
+            #end if
+
+            i = j + 1
+        #end while
+
+        if in_string and key_start is not None: key_prefix += chunk[max(key_start - base, 0):]
+        base += n
+    #end while
+
+    if depth != 0 or in_string: raise ValueError('Unexpected end of JSON settings file.')
+
+    return index
+#end def
+
+
+def _index_yaml(f):
+    """
+    Scans the YAML block mapping in ``f`` line by line; each top level key starts at the first column and its value extends to the next top level key.
+
+    :returns: a mapping from keys to tuples of byte offset and length of their ``key: value`` entries, or ``None`` if ``f`` is not a block mapping or uses anchors and aliases (which may refer to other top level entries)
+    :rtype: dict
+    """
+
+    index = {}
+    key, start = None, None
+    offset = 0
+    started = False
+
+    for line in f:
+        if (b'&' in line or b'*' in line) and _YAML_ANCHOR_RE.search(line) is not None: return None
+
+        first = line[:1]
+        if first in (b'', b' ', b'\t', b'\r', b'\n', b'#') or line.startswith(b'---') and not started:
+            offset += len(line)
+            continue
+        #end if
+
+        if line.startswith(b'...') or line.startswith(b'---'): break  # end of the first document
+
+        if key is not None and (line.startswith(b'- ') or line.rstrip() == b'-'):  # block sequences may start at the first column
+            offset += len(line)
+            continue
+        #end if
+
+        m = _YAML_KEY_RE.match(line.decode('utf-8'))
+        if m is None: return None
+
+        if key is not None: index[key] = (start, offset - start)
+
+        key = yaml_load(m.group(1))
+        start = offset
+        started = True
+        offset += len(line)
+    #end for
+
+    if key is not None: index[key] = (start, offset - start)
+
+    return index
+#end def
@@ -1,17 +1,79 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import inspect
 import json
 from multiprocessing import cpu_count
 import os
+from tempfile import TemporaryDirectory
+from threading import Thread
+import time
 import unittest
+from unittest import mock
+import warnings
 import yaml
 
 import ycsettings
 
 
+class SettingsHTTPRequestHandler(BaseHTTPRequestHandler):
+    """Serves ``server.documents``, a mapping from paths to tuples of content and response delay, and records requests in ``server.requests`` (and ``304`` responses in ``server.not_modified``); ``server.send_etag`` controls whether an ``ETag`` is sent."""
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', self.path))
+        self._send_headers()
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path))
+        content = self._send_headers()
+        if content is not None: self.wfile.write(content)
+    #end def
+
+    def _send_headers(self):
+        if self.path not in self.server.documents:
+            self.send_error(404)
+            return None
+        #end if
+
+        content, delay = self.server.documents[self.path]
+        time.sleep(delay)
+
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.server.send_etag and self.headers.get('If-None-Match') == etag:
+            self.server.not_modified.append(self.path)
+            self.send_response(304)
+            self.end_headers()
+            return None
+        #end if
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        if self.server.send_etag: self.send_header('ETag', etag)
+        self.end_headers()
+
+        return content
+    #end def
+
+    def log_message(self, *args): pass
+#end class
+
+
+def start_http_server(documents):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SettingsHTTPRequestHandler)
+    server.documents = documents
+    server.requests = []
+    server.not_modified = []
+    server.send_etag = True
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+#end def
+
+
 class TestYCSettings(unittest.TestCase):
     def setUp(self):
         settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml')
         with open(settings_file) as f:
-            self.settings = yaml.load(f)
+            self.settings = yaml.load(f, Loader=yaml.SafeLoader)
     #end def
 
     def test_env_setings(self):
@@ -27,6 +89,39 @@ class TestYCSettings(unittest.TestCase):
             del os.environ[k]
     #end def
 
+    def test_env_prefix(self):
+        os.environ['YCSETTINGS_TEST_KEY1'] = 'A'
+        os.environ['OTHER_YCSETTINGS_TEST_KEY2'] = 'B'
+        try:
+            settings = ycsettings.Settings(env_prefix='YCSETTINGS_TEST_')
+            self.assertEqual(settings.get('ycsettings_test_key1'), 'A')
+            self.assertIsNone(settings.get('other_ycsettings_test_key2'))
+            self.assertEqual(list(settings), ['ycsettings_test_key1'])
+
+            os.environ['YCSETTINGS_TEST_KEY3'] = 'C'
+            self.assertEqual(settings.get('YCSETTINGS_TEST_KEY3'), 'C')
+            self.assertEqual(settings.get('YCSETTINGS_TEST_KEY3', case_sensitive=True), 'C')
+            self.assertEqual(settings._search_environ('other_ycsettings_test_key2'), 'B')
+        finally:
+            for k in ['YCSETTINGS_TEST_KEY1', 'OTHER_YCSETTINGS_TEST_KEY2', 'YCSETTINGS_TEST_KEY3']: os.environ.pop(k, None)
+        #end try
+    #end def
+
+    def test_env_index(self):
+        os.environ['YC_A_TMP'] = '1'
+        try:
+            settings = ycsettings.Settings(search_first=['env'])
+            self.assertEqual(settings.get('yc_a_tmp', use_cache=False), '1')
+
+            del os.environ['YC_A_TMP']
+            os.environ['YC_B_TMP'] = '2'  # same number of environment variables
+            self.assertEqual(settings.get('yc_b_tmp', use_cache=False), '2')
+            self.assertIsNone(settings.get('yc_a_tmp', use_cache=False))
+        finally:
+            for k in ['YC_A_TMP', 'YC_B_TMP']: os.environ.pop(k, None)
+        #end try
+    #end def
+
     def test_env_settings_uri(self):
         os.environ['SETTINGS_URI'] = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml')
         self._assert_settings_object(search_first=['env_settings_uri'])
@@ -42,6 +137,123 @@ class TestYCSettings(unittest.TestCase):
     def test_settings_gz(self):
         self._assert_settings_object(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.json.gz'), search_first=[], string_dict_keys=True)
 
+    def test_parser_backends(self):
+        from ycsettings import parsers
+
+        assets_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets')
+        for fmt, fname, string_dict_keys in [('json', 'settings.json', True), ('yaml', 'settings.yaml', False)]:
+            default_backend = parsers.get_backend(fmt)
+            self.assertEqual(default_backend, parsers.available_backends(fmt)[0])
+            try:
+                for backend in parsers.available_backends(fmt):
+                    parsers.set_backend(fmt, backend)
+                    self._assert_settings_object(os.path.join(assets_dir, fname), search_first=[], string_dict_keys=string_dict_keys)
+                #end for
+            finally: parsers.set_backend(fmt)
+
+            self.assertEqual(parsers.get_backend(fmt), default_backend)
+        #end for
+
+        with self.assertRaises(ValueError): parsers.set_backend('json', 'nonexistent')
+
+        content = '{"big": 123456789012345678901234567890, "neg": -98765432109876543210, "nan": NaN, "inf": Infinity, "small": 1e300, "nested": "{\\"big\\": 123456789012345678901234567890}"}'
+        expected = json.loads(content)
+        try:
+            for backend in parsers.available_backends('json'):
+                parsers.set_backend('json', backend)
+                d = parsers.json_loads(content.encode('utf-8'))
+                self.assertEqual(d['big'], 123456789012345678901234567890)
+                self.assertEqual(d['neg'], -98765432109876543210)
+                self.assertEqual(repr(d), repr(expected))
+                self.assertEqual(ycsettings.Settings(dict(nested=d['nested']), search_first=[]).getdict('nested'), {'big': 123456789012345678901234567890})
+                with self.assertRaises(ValueError): parsers.json_loads('{"a": ')
+                with self.assertRaises(TypeError): parsers.json_loads(1)
+            #end for
+        finally: parsers.set_backend('json')
+    #end def
+
+    def test_streaming_settings(self):
+        from ycsettings.streaming import StreamingSettings, load_streaming
+
+        assets_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets')
+        self._assert_settings_object(os.path.join(assets_dir, 'settings.json'), search_first=[], string_dict_keys=True, stream=True)
+        self._assert_settings_object(os.path.join(assets_dir, 'settings.json.gz'), search_first=[], string_dict_keys=True, stream=True)
+        self._assert_settings_object(os.path.join(assets_dir, 'settings.yaml'), search_first=[], stream=True)
+
+        d = {'a"\\b': {'x': [1, {'y': 'z}"'}]}, 'k2': 3.5, 'k3': None, 'k4': 'str,with:colons{[', 'k5': [], 'k6': {}}
+        with TemporaryDirectory() as dirname:
+            settings_file = os.path.join(dirname, 'settings.json')
+            with open(settings_file, 'w') as f: json.dump(d, f, indent=2)
+            for chunk_size in [1, 3, 7, 1 << 20]:
+                settings = load_streaming(settings_file, chunk_size=chunk_size)
+                self.assertIsInstance(settings, StreamingSettings)
+                self.assertEqual(dict(settings.items()), d)
+                settings.close()
+            #end for
+
+            settings_file = os.path.join(dirname, 'settings.jsonl')
+            with open(settings_file, 'w') as f: f.write('{"key1": 1, "key2": [1, 2]}\n{"key1": 2}\n')
+            self.assertEqual(dict(ycsettings.Settings(settings_file, search_first=[], stream=True).items()), {'key1': 2, 'key2': [1, 2]})
+
+            settings_file = os.path.join(dirname, 'settings.yaml')
+            with open(settings_file, 'w') as f: f.write('base: &base {a: 1}\nprod:\n  <<: *base\n  b: 2\nalias: *base\nglob: "*.txt & more"\n')
+            self.assertIsInstance(load_streaming(settings_file), dict)
+            self.assertEqual(ycsettings.Settings(settings_file, search_first=[], stream=True).get('prod'), {'a': 1, 'b': 2})
+            self.assertEqual(ycsettings.Settings(settings_file, search_first=[], stream=True).get('alias'), {'a': 1})
+
+            with open(settings_file, 'w') as f: f.write('key1: "a & b"\nkey2: x*y\n')
+            settings = load_streaming(settings_file)
+            self.assertIsInstance(settings, StreamingSettings)
+            self.assertEqual(dict(settings.items()), {'key1': 'a & b', 'key2': 'x*y'})
+            settings.close()
+        #end with
+    #end def
+
+    def test_compiled_settings(self):
+        from ycsettings import ycs
+        from ycsettings.__main__ import main
+
+        assets_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets')
+        with TemporaryDirectory() as dirname:
+            settings_file = os.path.join(dirname, 'settings.ycs')
+            main(['compile', os.path.join(assets_dir, 'settings.yaml'), '-o', settings_file])
+            self._assert_settings_object(settings_file, search_first=[])
+
+            ycs.dump({'Key1': 1, 'KEY1': 2, 'key2': [1, 2]}, settings_file)
+            settings = ycs.load(settings_file)
+            self.assertEqual(list(settings), ['Key1', 'KEY1', 'key2'])
+            self.assertEqual(settings['KEY1'], 2)
+            self.assertNotIn('key1', settings)
+            self.assertEqual(settings.find_key('key1'), 'Key1')
+            self.assertEqual(ycsettings.Settings(settings_file, search_first=[]).get('KEY2'), [1, 2])
+
+            with self.assertRaises(ValueError): ycs.YCSSettings(b'not a ycs file and long enough for a header')
+        #end with
+    #end def
+
+    def test_shared_settings(self):
+        import pickle
+        from ycsettings.shared import SharedSettings
+
+        settings = ycsettings.Settings(self.settings, search_first=[])
+        shm = settings.share()
+        try:
+            shared_settings = SharedSettings(shm.name)
+            self.assertEqual(dict(shared_settings.items()), dict(settings.items()))
+            self.assertEqual(shared_settings.getint('YCSETTINGS_INT'), 1)
+            shared_settings.close()
+
+            shared_settings = pickle.loads(pickle.dumps(SharedSettings(shm.name, case_sensitive=True)))
+            self.assertTrue(shared_settings.case_sensitive)
+            self.assertEqual(shared_settings.get('ycsettings_bool'), True)
+            self.assertIsNone(shared_settings.get('YCSETTINGS_BOOL'))
+            shared_settings.close()
+        finally:
+            shm.close()
+            shm.unlink()
+        #end try
+    #end def
+
     def test_settings_ini(self):
         self._assert_settings_object(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.ini'), search_first=[], string_list=True)
 
@@ -57,6 +269,25 @@ class TestYCSettings(unittest.TestCase):
     def test_settings_module(self):
         self._assert_settings_object('ycsettings.test.assets.settings', search_first=[])
 
+    def test_settings_py_compiled_once(self):
+        settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.py')
+        ycsettings.settings._compiled_code.clear()
+        with mock.patch('ycsettings.settings.compile', wraps=compile, create=True) as compile_mock, mock.patch('tempfile.NamedTemporaryFile', side_effect=AssertionError):
+            for _ in range(3): self.assertEqual(ycsettings.Settings(settings_file, search_first=[]).getint('ycsettings_int'), 1)
+        #end with
+        self.assertEqual(compile_mock.call_count, 1)
+    #end def
+
+    def test_reuse_imported_modules(self):
+        import ycsettings.test.assets.settings as settings_module
+
+        settings_module.ycsettings_int = 2
+        try:
+            self.assertEqual(ycsettings.Settings('ycsettings.test.assets.settings', search_first=[]).getint('ycsettings_int'), 1)
+            self.assertEqual(ycsettings.Settings('ycsettings.test.assets.settings', search_first=[], reuse_imported_modules=True).getint('ycsettings_int'), 2)
+        finally: settings_module.ycsettings_int = 1
+    #end def
+
     def test_settings_dict(self):
         self._assert_settings_object(self.settings, search_first=[])
 
@@ -73,6 +304,532 @@ class TestYCSettings(unittest.TestCase):
         settings = ycsettings.Settings(dict(key1='A'), dict(key1='B', key2='B'), search_first=[])
         self.assertEqual(settings.get('key1'), 'A')
         self.assertEqual(settings.get('key2'), 'B')
+        self.assertIn('KEY1', settings)
+        self.assertNotIn('key3', settings)
+        self.assertEqual(len(settings), 2)
+    #end def
+
+    def test_frozen_settings(self):
+        self._assert_settings_object(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml'), search_first=[], frozen=True)
+
+        settings = ycsettings.Settings(dict(key1='A'), dict(KEY1='B', key2='B'), search_first=[], frozen=True)
+        self.assertEqual(settings.get('Key1'), 'A')
+        self.assertEqual(settings.get('key2'), 'B')
+        self.assertIn('KEY2', settings)
+        self.assertNotIn('key3', settings)
+        self.assertEqual(list(settings), ['key1', 'key2'])
+        self.assertEqual(len(settings), 2)
+        self.assertEqual(settings.get('KEY1', case_sensitive=True), 'B')
+    #end def
+
+    def test_lazy_settings(self):
+        settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml')
+        self._assert_settings_object(settings_file, search_first=[], lazy=True)
+
+        settings = ycsettings.Settings(dict(key1='A'), settings_file, 'ycsettings.test.assets.settings', search_first=[], lazy=True)
+        self.assertEqual(settings.get('key1'), 'A')
+        self.assertTrue(all(isinstance(v, ycsettings.settings._DeferredSource) for k, v in settings._snapshot.settings.items() if k != 'dict_0'))
+        self.assertEqual(settings.getint('ycsettings_int'), 1)
+        self.assertIsInstance(settings._snapshot.settings[settings_file], dict)
+        self.assertIsInstance(settings._snapshot.settings['ycsettings.test.assets.settings'], ycsettings.settings._DeferredSource)
+        self.assertIsNone(settings.get('key2'))
+        self.assertIsInstance(settings._snapshot.settings['ycsettings.test.assets.settings'], dict)
+    #end def
+
+    def test_prefetch_settings(self):
+        documents = dict(('/settings{}.json'.format(i), (json.dumps(dict(key=i, **{'key{}'.format(i): i})).encode('utf-8'), 0.5)) for i in range(4))
+        server, base_uri = start_http_server(documents)
+        uris = [base_uri + path for path in sorted(documents.keys())]
+
+        try:
+            start_time = time.time()
+            settings = ycsettings.Settings(*uris, search_first=[], prefetch=True)
+            self.assertLess(time.time() - start_time, 1.5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        #end try
+
+        self.assertEqual(list(settings._snapshot.settings.keys()), uris)
+        self.assertEqual(settings.getint('key'), 0)
+        for i in range(4): self.assertEqual(settings.getint('key{}'.format(i)), i)
+    #end def
+
+    def test_async_settings(self):
+        import asyncio
+
+        documents = dict(('/settings{}.json'.format(i), (json.dumps(dict(key=i, **{'key{}'.format(i): i})).encode('utf-8'), 0.5)) for i in range(4))
+        server, base_uri = start_http_server(documents)
+        uris = [base_uri + path for path in sorted(documents.keys())]
+        ticks = []
+
+        async def _tick():
+            while True:
+                ticks.append(time.time())
+                await asyncio.sleep(0.05)
+            #end while
+        #end def
+
+        async def _main():
+            ticker = asyncio.ensure_future(_tick())
+            start_time = time.time()
+            settings = await ycsettings.Settings.create(*uris, search_first=[])
+            elapsed = time.time() - start_time
+
+            self.assertEqual(await settings.aget('key', cast_func=int), 0)
+            self.assertEqual(await settings.aget('key5', additional_sources=[dict(key5='5')]), '5')
+            self.assertEqual(await settings.with_overrides(key='A').aget('key'), 'A')
+
+            for path in documents: documents[path] = (documents[path][0].replace(b'}', b', "new": 1}'), 0.5)
+            start_time = time.time()
+            reloaded = await settings.areload()
+            reload_elapsed = time.time() - start_time
+            ticker.cancel()
+
+            return settings, elapsed, reloaded, reload_elapsed
+        #end def
+
+        try: settings, elapsed, reloaded, reload_elapsed = asyncio.run(_main())
+        finally:
+            server.shutdown()
+            server.server_close()
+        #end try
+
+        self.assertLess(elapsed, 1.5)
+        self.assertGreater(len(ticks), 10)  # the event loop kept running while the sources were loaded
+        self.assertEqual(len(reloaded), 4)
+        self.assertLess(reload_elapsed, 1.5)
+        self.assertEqual(settings.getint('new'), 1)
+        for i in range(4): self.assertEqual(settings.getint('key{}'.format(i)), i)
+    #end def
+
+    def test_cache_dir(self):
+        with TemporaryDirectory() as dirname:
+            cache_dir = os.path.join(dirname, 'cache')
+            settings_file = os.path.join(dirname, 'settings.json')
+            with open(settings_file, 'w') as f: json.dump(dict(key1='A'), f)
+
+            self.assertEqual(ycsettings.Settings(settings_file, search_first=[], cache_dir=cache_dir).get('key1'), 'A')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            with mock.patch.object(ycsettings.Settings, '_load_settings_from_file', side_effect=AssertionError):
+                self.assertEqual(ycsettings.Settings(settings_file, search_first=[], cache_dir=cache_dir).get('key1'), 'A')
+
+            with open(settings_file, 'w') as f: json.dump(dict(key1='BB'), f)
+            settings = ycsettings.Settings(settings_file, search_first=[], cache_dir=cache_dir)
+            self.assertEqual(settings.get('key1'), 'BB')
+
+            with open(settings_file, 'w') as f: json.dump(dict(key1='CCC'), f)
+            with mock.patch.object(ycsettings.settings.SourceCache, 'put', autospec=True, side_effect=ycsettings.settings.SourceCache.put) as put:
+                self.assertEqual(settings.reload(), [settings_file])
+                self.assertEqual(put.call_count, 1)
+            #end with
+            self.assertEqual(settings.get('key1'), 'CCC')
+        #end with
+    #end def
+
+    def test_cache_dir_etag(self):
+        server, base_uri = start_http_server({'/settings.json': (b'{"key1": "A"}', 0)})
+        try:
+            with TemporaryDirectory() as cache_dir:
+                for _ in range(3):
+                    self.assertEqual(ycsettings.Settings(base_uri + '/settings.json', search_first=[], cache_dir=cache_dir).get('key1'), 'A')
+
+                server.documents['/settings.json'] = (b'{"key1": "B"}', 0)
+                self.assertEqual(ycsettings.Settings(base_uri + '/settings.json', search_first=[], cache_dir=cache_dir).get('key1'), 'B')
+            #end with
+        finally:
+            server.shutdown()
+            server.server_close()
+        #end try
+
+        self.assertEqual([method for method, _ in server.requests], ['HEAD', 'GET', 'HEAD', 'HEAD', 'HEAD', 'GET'])
+    #end def
+
+    def test_conditional_reload(self):
+        server, base_uri = start_http_server({'/a.json': (b'{"key1": "A", "key2": "B"}', 0), '/b.json': (b'{"key3": "C"}', 0)})
+        uri_a, uri_b = base_uri + '/a.json', base_uri + '/b.json'
+        try:
+            settings = ycsettings.Settings(uri_a, uri_b, search_first=[], refresh_ttl={uri_b: 3600})
+            self.assertEqual([settings.get(k) for k in ['key1', 'key2', 'key3']], ['A', 'B', 'C'])
+            self.assertIsNone(settings.get('key4'))
+
+            with mock.patch.object(settings, '_load_settings_from_content', wraps=settings._load_settings_from_content) as load:
+                self.assertEqual(settings.reload(), [])
+                self.assertEqual(load.call_count, 0)
+            #end with
+            self.assertEqual(server.requests, [('GET', '/a.json'), ('GET', '/b.json'), ('GET', '/a.json')])  # b.json is not checked before its TTL expires
+            self.assertEqual(server.not_modified, ['/a.json'])
+
+            server.documents['/a.json'] = (b'{"key1": "A2"}', 0)
+            self.assertEqual(settings.reload(), [uri_a])
+            self.assertEqual(set(settings._snapshot.cache), {'key3'})
+            self.assertEqual(set(settings._snapshot.missing), {'key4'})
+            self.assertEqual([settings.get(k) for k in ['key1', 'key2', 'key3']], ['A2', None, 'C'])
+
+            self.assertEqual(settings.reload(force=True), [uri_a, uri_b])
+            self.assertEqual(server.not_modified, ['/a.json'])
+
+            # without validators, sources are only checked with a refresh_ttl, and unchanged content is not parsed again
+            server.send_etag = False
+            settings = ycsettings.Settings(uri_a, search_first=[])
+            del server.requests[:]
+            self.assertEqual(settings.reload(), [])
+            self.assertEqual(server.requests, [])
+
+            settings = ycsettings.Settings(uri_a, search_first=[], refresh_ttl=0)
+            with mock.patch.object(settings, '_load_settings_from_content', wraps=settings._load_settings_from_content) as load:
+                self.assertEqual(settings.reload(), [])
+                self.assertEqual(load.call_count, 0)
+            #end with
+
+            server.documents['/a.json'] = (b'{"key1": "A3"}', 0)
+            self.assertEqual(settings.reload(), [uri_a])
+            self.assertEqual(settings.get('key1'), 'A3')
+        finally:
+            server.shutdown()
+            server.server_close()
+        #end try
+    #end def
+
+    def test_reload(self):
+        with TemporaryDirectory() as dirname:
+            settings_file = os.path.join(dirname, 'settings.json')
+            with open(settings_file, 'w') as f: json.dump(dict(key1='1', key2='A'), f)
+
+            settings = ycsettings.Settings(dict(key2='B'), settings_file, search_first=[])
+            self.assertEqual(settings.getint('key1'), 1)
+            self.assertEqual(settings.reload(), [])
+
+            changes = []
+            settings.on_change('KEY1', lambda *args: changes.append(args))
+            settings.on_change('key2', lambda *args: changes.append(args))
+
+            with open(settings_file, 'w') as f: json.dump(dict(key1='22', key2='C'), f)
+            self.assertEqual(settings.reload(), [settings_file])
+            self.assertEqual(settings.getint('key1'), 22)
+            self.assertEqual(settings.get('key2'), 'B')
+            self.assertEqual(changes, [('key1', '1', '22')])
+
+            settings.watch(interval=0.01)
+            try:
+                with open(settings_file, 'w') as f: json.dump(dict(key1='333'), f)
+                for _ in range(500):
+                    if len(changes) > 1: break
+                    time.sleep(0.01)
+                #end for
+            finally: settings.stop_watching()
+
+            self.assertEqual(changes[1], ('key1', '22', '333'))
+            self.assertEqual(settings.getint('key1'), 333)
+        #end with
+    #end def
+
+    def test_partial_iteration(self):
+        settings = ycsettings.Settings(dict(key1='A', key2='B'), dict(key3='C'), search_first=[])
+        self.assertEqual(next(iter(settings)), 'key1')
+        self.assertEqual(len(settings), 3)
+        self.assertEqual(list(settings), ['key1', 'key2', 'key3'])
+    #end def
+
+    def test_concurrent_reads(self):
+        with TemporaryDirectory() as dirname:
+            settings_file = os.path.join(dirname, 'settings.json')
+            with open(settings_file, 'w') as f: json.dump(dict(('file_key{}'.format(i), str(i)) for i in range(200)), f)
+
+            sources = [dict(('dict{}_key{}'.format(j, i), str(i)) for i in range(50)) for j in range(4)]
+            settings = ycsettings.Settings(*sources, settings_file, search_first=[], lazy=True)
+            expected_len = 4 * 50 + 200
+            errors = []
+
+            def _read(n):
+                try:
+                    for i in range(300):
+                        if i % 50 == 0: self.assertEqual(len(settings), expected_len)
+                        if i % 75 == 0: self.assertEqual(len(list(settings)), expected_len)
+                        self.assertEqual(settings.getint('FILE_KEY{}'.format((i * n) % 200)), (i * n) % 200)
+                        self.assertEqual(settings.get('dict{}_key{}'.format(i % 4, i % 50)), str(i % 50))
+                        self.assertIsNone(settings.get('missing_key{}'.format(i)))
+                    #end for
+                except Exception as e: errors.append(e)
+            #end def
+
+            def _reload():
+                try:
+                    for _ in range(20): settings.reload(force=True)
+                except Exception as e: errors.append(e)
+            #end def
+
+            threads = [Thread(target=_read, args=(n,)) for n in range(16)] + [Thread(target=_reload)]
+            for t in threads: t.start()
+            for t in threads: t.join()
+        #end with
+
+        self.assertEqual(errors, [])
+    #end def
+
+    def test_get_many(self):
+        settings = ycsettings.Settings(dict(key1='1', key2='true'), dict(KEY2='false', key3='a, b', Key4='{"a": 1}'), search_first=[])
+        self.assertEqual(settings.get_many(['key1', 'KEY2', 'key3']), {'key1': '1', 'KEY2': 'true', 'key3': 'a, b'})
+        self.assertEqual(settings.get_many(['key1', 'key2', 'key3', 'key4', 'key5'], casts=dict(key1=int, key2='bool', key3='list', key4='dict'), defaults=dict(key5=5)), {'key1': 1, 'key2': True, 'key3': ['a', 'b'], 'key4': {'a': 1}, 'key5': 5})
+        self.assertEqual(settings.get_many(['key1'], casts=float), {'key1': 1.0})
+        self.assertEqual(settings.get_many(['key2', 'Key2'], case_sensitive=True), {'key2': 'true', 'Key2': None})
+        self.assertEqual(settings.getint('key1'), 1)
+
+        with self.assertRaisesRegex(ycsettings.MissingSettingException, '"key5", "key6"'):
+            settings.get_many(['key1', 'key5', 'key6'], raise_exception=True)
+        with self.assertWarns(UserWarning):
+            settings.get_many(['key5', 'key6'], warn_missing=True)
+
+        self.assertEqual(settings.get_schema(dict(key1='int', key2=('bool', False), key5=('int', 5))), {'key1': 1, 'key2': True, 'key5': 5})
+        frozen_settings = ycsettings.Settings(dict(key1='1'), search_first=[], frozen=True)
+        self.assertEqual(frozen_settings.get_many(['KEY1', 'key2'], casts='int'), {'KEY1': 1, 'key2': None})
+    #end def
+
+    def test_compiled_schema(self):
+        from ycsettings.schema import Field, InvalidSettingsException, Schema
+
+        settings = ycsettings.Settings(dict(key1='1', key2='true', key3='a, b', **{'n-jobs': '2'}), search_first=[])
+        schema = Schema(dict(key1=Field('int', validator=lambda v: v > 0), key2='bool', key3=('list', []), key4=(int, 4), n_jobs=Field('njobs', key='n-jobs')))
+        compiled = schema.compile(settings)
+        self.assertEqual((compiled.key1, compiled.key2, compiled.key3, compiled.key4, compiled.n_jobs), (1, True, ['a', 'b'], 4, 2))
+        self.assertEqual(compiled._asdict()['key4'], 4)
+        with self.assertRaises(AttributeError): compiled.key1 = 2
+        with self.assertRaises(AttributeError): compiled.other = 2
+
+        with self.assertRaisesRegex(ycsettings.MissingSettingException, '"key5", "key6"'):
+            Schema(dict(key5=Field(required=True), key6=Field('int', required=True))).compile(settings)
+        with self.assertRaisesRegex(InvalidSettingsException, '"key1".*"key3"'):
+            Schema(dict(key1=Field('int', validator=lambda v: v > 1), key3='int')).compile(settings)
+        with self.assertRaises(ValueError): Schema({'n-jobs': 'njobs'})
+    #end def
+
+    def test_metrics(self):
+        events = []
+        metrics = ycsettings.metrics.SettingsMetrics(callback=events.append)
+        settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml')
+        settings = ycsettings.Settings(dict(key1='1'), settings_file, search_first=[], metrics=metrics)
+
+        self.assertEqual(settings.getint('key1'), 1)
+        self.assertEqual(settings.getint('key1'), 1)
+        self.assertEqual(settings.get('ycsettings_int'), 1)
+        self.assertEqual(settings.get('ycsettings_int'), 1)
+        self.assertIsNone(settings.get('key2'))
+        self.assertEqual(settings.get_many(['key1', 'ycsettings_float']), {'key1': '1', 'ycsettings_float': 1.5})
+
+        report = metrics.report()
+        self.assertEqual(report['totals']['lookups'], 6)
+        self.assertEqual(report['totals']['cache_hits'], 2)
+        self.assertEqual(report['totals']['casts'], 1)
+        self.assertEqual(report['totals']['cast_cache_hits'], 1)
+        self.assertEqual(report['keys']['ycsettings_int']['source'], settings_file)
+        self.assertEqual(report['keys']['key2']['source'], None)
+        self.assertEqual(report['sources'][settings_file]['keys'], len(self.settings))
+        self.assertEqual(report['sources'][settings_file]['answers'], 2)
+        self.assertEqual(metrics.hot_keys(1), [('key1', 3)])
+        self.assertEqual(set(event['type'] for event in events), {'load', 'lookup', 'cast'})
+
+        self.assertIsNone(ycsettings.Settings(search_first=[]).metrics)
+    #end def
+
+    def test_string_source_classification(self):
+        from ycsettings.settings import _classify_string_source
+
+        for source in ['/etc/app/settings.yaml', 's3://bucket/x.json', 'C:\\settings.json', 'file://x.ini', 'my-settings.yaml', '~/x']:
+            self.assertEqual(_classify_string_source(source), 'uri')
+        for source in ['myapp.settings', 'settings', 'settings.yaml']:
+            self.assertEqual(_classify_string_source(source), 'module')
+
+        settings_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets', 'settings.yaml')
+        with mock.patch('importlib.util.find_spec', wraps=__import__('importlib').util.find_spec) as find_spec:
+            self._assert_settings_object(settings_file, search_first=[])
+            with self.assertRaises(FileNotFoundError): ycsettings.Settings('nonexistent_ycsettings_file.yaml', search_first=[])
+            self._assert_settings_object('ycsettings.test.assets.settings', search_first=[])
+        #end with
+
+        probed = [c[0][0] for c in find_spec.call_args_list]
+        self.assertNotIn(settings_file, probed)
+        self.assertIn('nonexistent_ycsettings_file.yaml', probed)
+        self.assertIn('ycsettings.test.assets.settings', probed)
+    #end def
+
+    def test_lazy_imports(self):
+        import subprocess
+        import sys
+
+        code = 'import sys; import ycsettings; ycsettings.Settings(search_first=["env"]).get("HOME"); print(",".join(m for m in ["uriutils", "yaml", "pickle", "configparser", "multiprocessing", "concurrent.futures", "urllib.request"] if m in sys.modules))'
+        package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        output = subprocess.run([sys.executable, '-S', '-c', code], stdout=subprocess.PIPE, check=True, universal_newlines=True, cwd=package_dir).stdout
+        self.assertEqual(output.strip(), '')
+    #end def
+
+    def test_source_traces(self):
+        from io import StringIO
+        from ycsettings.__main__ import main
+
+        assets_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'assets')
+        sources = [os.path.join(assets_dir, 'settings.json.gz'), 'ycsettings.test.assets.settings', dict(key1=1)]
+        settings = ycsettings.Settings(*sources, search_first=['env'], trace=True)
+
+        traces = dict((trace.source, trace) for trace in settings.source_traces)
+        self.assertEqual([trace.resolver for trace in settings.source_traces], ['env', 'uri', 'module', 'dict'])
+        self.assertEqual(traces[sources[0]].keys, len(self.settings))
+        self.assertGreater(traces[sources[0]].bytes, 0)
+        self.assertIsNone(traces[sources[0]].resolve_time)  # paths are not probed as modules
+        self.assertIsNotNone(traces['ycsettings.test.assets.settings'].resolve_time)
+        self.assertIsNotNone(traces[sources[0]].parse_time)
+        self.assertIsNotNone(traces['ycsettings.test.assets.settings'].parse_time)
+        self.assertIsNone(ycsettings.Settings(search_first=[]).source_traces)
+
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            main(['profile', '--no-env', sources[0]])
+        self.assertIn(sources[0], stdout.getvalue())
+    #end def
+
+    def test_missing_cache(self):
+        settings = ycsettings.Settings(dict(key1='1'), search_first=['env'])
+        with mock.patch.object(settings, '_lookup', wraps=settings._lookup) as lookup:
+            self.assertIsNone(settings.get('ycsettings_missing_key'))
+            self.assertEqual(settings.get('ycsettings_missing_key', default=2), 2)
+            self.assertNotIn('ycsettings_missing_key', settings)
+            self.assertEqual(settings.get_many(['ycsettings_missing_key', 'key1']), {'ycsettings_missing_key': None, 'key1': '1'})
+            self.assertEqual(lookup.call_count, 1)
+
+            with self.assertRaises(ycsettings.MissingSettingException): settings.get('ycsettings_missing_key', raise_exception=True)
+            with self.assertWarns(UserWarning): settings.get('ycsettings_missing_key', warn_missing=True)
+            self.assertIsNone(settings.get('YCSETTINGS_MISSING_KEY', case_sensitive=True))
+            self.assertEqual(lookup.call_count, 2)
+        #end with
+
+        os.environ['YCSETTINGS_MISSING_KEY'] = 'found'
+        try: self.assertEqual(settings.get('ycsettings_missing_key'), 'found')
+        finally: del os.environ['YCSETTINGS_MISSING_KEY']
+
+        os.environ['YC_A_TMP'] = '1'
+        try:
+            settings = ycsettings.Settings(search_first=['env'])
+            self.assertIsNone(settings.get('yc_b_tmp'))
+            self.assertNotIn('yc_b_tmp', settings)
+            self.assertEqual(settings.get_many(['yc_b_tmp']), {'yc_b_tmp': None})
+
+            del os.environ['YC_A_TMP']
+            os.environ['YC_B_TMP'] = '2'  # same number of environment variables
+            self.assertEqual(settings.get('yc_b_tmp'), '2')
+            self.assertIn('yc_b_tmp', settings)
+            self.assertIsNone(settings.get('yc_a_tmp'))
+            self.assertNotIn('yc_a_tmp', settings)
+        finally:
+            for k in ['YC_A_TMP', 'YC_B_TMP']: os.environ.pop(k, None)
+        #end try
+    #end def
+
+    def test_additional_sources(self):
+        with TemporaryDirectory() as dirname:
+            tenant_file = os.path.join(dirname, 'tenant.json')
+            with open(tenant_file, 'w') as f: json.dump(dict(key2='tenant', key3='3'), f)
+
+            settings = ycsettings.Settings(dict(key1='main'), search_first=[])
+            with mock.patch.object(settings, '_load_settings_from_uri', wraps=settings._load_settings_from_uri) as load:
+                for _ in range(3):
+                    self.assertEqual(settings.get('key2', additional_sources=[tenant_file]), 'tenant')
+                    self.assertEqual(settings.get('key1', additional_sources=[tenant_file]), 'main')
+                    self.assertEqual(settings.getint('key3', additional_sources=[tenant_file]), 3)
+                #end for
+                self.assertEqual(settings.reload(), [])  # unchanged additional sources stay cached
+                self.assertEqual(settings.get('key2', additional_sources=[tenant_file]), 'tenant')
+                self.assertEqual(load.call_count, 1)
+            #end with
+
+            self.assertIsNone(settings.get('key2'))
+            self.assertIsNone(settings.getint('key3'))
+            self.assertEqual(settings.get('key2', additional_sources=[dict(key2='other')]), 'other')
+
+            with open(tenant_file, 'w') as f: json.dump(dict(key2='updated'), f)
+            settings.reload()
+            self.assertEqual(settings.get('key2', additional_sources=[tenant_file]), 'updated')
+        #end with
+    #end def
+
+    def test_with_overrides(self):
+        settings = ycsettings.Settings(dict(key1='main', key2='2', key3='3'), search_first=[])
+        overlay = settings.with_overrides(dict(KEY2='20'), key4='tenant')
+
+        self.assertEqual(overlay.get('key1'), 'main')
+        self.assertEqual(overlay.getint('key2'), 20)
+        self.assertEqual(overlay.getint('Key2'), 20)
+        self.assertEqual(overlay['key4'], 'tenant')
+        self.assertEqual(settings.getint('key2'), 2)
+        self.assertIsNone(settings.get('key4'))
+        self.assertEqual(overlay.get_many(['key1', 'key2', 'key3'], casts=dict(key2='int', key3='int')), dict(key1='main', key2=20, key3=3))
+        self.assertIn('key4', overlay)
+        self.assertNotIn('key4', settings)
+        self.assertEqual(sorted(overlay), ['key1', 'key2', 'key3', 'key4'])
+        self.assertEqual(len(overlay), 4)
+
+        nested = overlay.with_overrides(key1='nested')
+        self.assertEqual(nested.get('key1'), 'nested')
+        self.assertEqual(nested.getint('key2'), 20)
+        self.assertEqual(overlay.get('key1'), 'main')
+
+        for attr in ['source_traces', 'refresh_ttl', 'env_prefix', 'stream', 'case_sensitive']: self.assertEqual(getattr(nested, attr), getattr(settings, attr))
+        for i in range(100): self.assertEqual(overlay.get('key2', cast_func=lambda v: int(v) + i), 20 + i)
+        self.assertLessEqual(sum(len(casted) for casted in overlay._cast_cache.values()), ycsettings.settings._MAX_CASTS_PER_KEY)
+
+        with mock.patch.object(settings, 'watch') as watch:
+            nested.watch()
+            watch.assert_called_once_with(inspect.signature(ycsettings.Settings.watch).parameters['interval'].default)
+        #end with
+    #end def
+
+    def test_casted_cache(self):
+        calls = []
+
+        def _cast(v):
+            calls.append(v)
+            return int(v)
+        #end def
+
+        settings = ycsettings.Settings(dict(key1='1', key2='{"a": [1, 2]}', key3='a, b'), search_first=[])
+        self.assertEqual(settings.get('key1', cast_func=_cast), 1)
+        self.assertEqual(settings.get('KEY1', cast_func=_cast), 1)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(settings.get('key1', cast_func=_cast, use_cache=False), 1)
+        self.assertEqual(len(calls), 2)
+
+        d = settings.getdict('key2')
+        self.assertIs(settings.getdict('key2'), d)
+        e = settings.getdict('key2', copy=True)
+        self.assertEqual(e, d)
+        self.assertIsNot(e, d)
+        with self.assertRaises(TypeError): d['b'] = 1
+        with self.assertRaises(TypeError): d['a'].append(3)
+        e['a'].append(3)
+        self.assertEqual(settings.getdict('key2'), {'a': [1, 2]})
+
+        with self.assertRaises(TypeError): settings.getlist('key3').append('x')
+        l = settings.getlist('key3', copy=True)
+        l.append('x')
+        self.assertEqual(l, ['a', 'b', 'x'])
+        self.assertEqual(settings.getlist('key3'), ['a', 'b'])
+        self.assertEqual(settings.getlist('key3', delimiter=';'), ['a, b'])
+        self.assertEqual(settings.getlist('key4', default='c, d'), ['c', 'd'])
+        self.assertEqual(settings.getdict('key4', default='{"b": 1}'), {'b': 1})
+        self.assertEqual(settings.get('key2'), '{"a": [1, 2]}')
+    #end def
+
+    def test_case_insensitive_collisions(self):
+        with self.assertWarns(UserWarning):
+            settings = ycsettings.Settings(dict(Key1='A', KEY1='B', key2='C'), search_first=[])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertEqual(settings.get('key1'), 'A')
+            self.assertEqual(settings.get('KEY2'), 'C')
+        #end with
+
+        settings = ycsettings.Settings(dict(Key1='A', KEY1='B'), search_first=[], case_sensitive=True)
+        self.assertEqual(settings.get('KEY1'), 'B')
+        self.assertEqual(settings.get('Key1', case_sensitive=False), 'A')
     #end def
 
     def _assert_settings_object(self, *args, string_list=False, string_dict_keys=False, **kwargs):
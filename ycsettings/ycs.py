@@ -0,0 +1,219 @@
+"""
+This module contains the compact binary settings format (``.ycs``).
+
+A ``.ycs`` file is opened with :mod:`mmap`, so opening it takes constant time regardless of its size, and processes that open the same file share a single page cached copy.
+It contains a hash index of the keys and every value is pickled separately, so values are only decoded when they are looked up.
+
+The layout of a file (all integers are little endian) is:
+
+* header: magic ``b'YCS\\x01'``, number of entries (``uint64``), number of hash slots (``uint64``, a power of two), and the offset of the hash table (``uint64``)
+* entries, in priority order: key length (``uint32``), value length (``uint64``), UTF-8 encoded key, and pickled value
+* hash table: one slot per ``uint32`` hash of the lowercased key followed by the ``uint64`` offset of its entry (``0`` for empty slots); collisions are resolved by linear probing
+
+Use :func:`dump` (or ``ycsettings compile``) to write ``.ycs`` files, and :func:`load` or :class:`YCSSettings` to read them.
+"""
+
+__all__ = ['YCSSettings', 'dump', 'dumps', 'load']
+
+
+from collections.abc import Mapping
+import mmap
+import os
+import struct
+import zlib
+
+
+MAGIC = b'YCS\x01'
+
+_HEADER = struct.Struct('<4sQQQ')
+_ENTRY = struct.Struct('<IQ')
+_SLOT = struct.Struct('<IQ')
+
+
+def _hash(lower_key_bytes):
+    return zlib.crc32(lower_key_bytes)
+
+
+def dumps(settings):
+    """
+    Encodes the mapping ``settings`` in the ``.ycs`` format.
+
+    :param dict settings: settings to encode; keys must be strings
+    :rtype: bytes
+    """
+
+    import pickle
+
+    n_entries = len(settings)
+    n_slots = 8
+    while n_slots < 2 * n_entries: n_slots *= 2
+
+    parts = []
+    slots = [None] * n_slots
+    offset = _HEADER.size
+    for key, value in settings.items():
+        if not isinstance(key, str): raise TypeError('Keys of .ycs settings must be strings, not {}.'.format(type(key).__name__))
+
+        key_bytes = key.encode('utf-8')
+        value_bytes = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        parts.append(_ENTRY.pack(len(key_bytes), len(value_bytes)))
+        parts.append(key_bytes)
+        parts.append(value_bytes)
+
+        h = _hash(key.lower().encode('utf-8'))
+        i = h & (n_slots - 1)
+        while slots[i] is not None: i = (i + 1) & (n_slots - 1)
+        slots[i] = (h, offset)
+
+        offset += _ENTRY.size + len(key_bytes) + len(value_bytes)
+    #end for
+
+    parts.insert(0, _HEADER.pack(MAGIC, n_entries, n_slots, offset))
+    parts.extend(_SLOT.pack(*slot) if slot else _SLOT.pack(0, 0) for slot in slots)
+
+    return b''.join(parts)
+#end def
+
+
+def dump(settings, path):
+    """
+    Writes the mapping ``settings`` to the ``.ycs`` file at ``path``.
+    The file is written to a temporary file and renamed, so processes that have the old file mapped keep a consistent copy.
+    """
+
+    from tempfile import NamedTemporaryFile
+
+    data = dumps(settings)
+    with NamedTemporaryFile(mode='wb', dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp', delete=False) as f:
+        f.write(data)
+        temp_fname = f.name
+    #end with
+
+    os.replace(temp_fname, path)
+#end def
+
+
+def load(path):
+    """
+    Opens the ``.ycs`` file at ``path`` using :mod:`mmap`.
+
+    :rtype: YCSSettings
+    """
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0: raise ValueError('<{}> is not a .ycs settings file.'.format(path))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    #end with
+
+    return YCSSettings(buf, name=path)
+#end def
+
+
+class YCSSettings(Mapping):
+    """
+    A read-only mapping over a buffer in the ``.ycs`` format (i.e., a :class:`mmap.mmap`, :obj:`bytes`, or shared memory).
+    Keys are looked up using the hash index and values are unpickled on every lookup.
+    """
+
+    def __init__(self, buf, name=None):
+        """
+        :param buf: buffer containing a ``.ycs`` encoded settings
+        :param str name: name of the source, used in error messages
+        """
+
+        import pickle
+
+        self._buf = memoryview(buf)
+        self._loads = pickle.loads
+        self.name = name
+
+        magic, self._n_entries, self._n_slots, self._table_offset = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC: raise ValueError('<{}> is not a .ycs settings file.'.format(name))
+
+        self.key_index = _YCSKeyIndex(self)
+    #end def
+
+    def _find(self, key, case_sensitive=True):
+        """
+        :returns: a tuple of the offset of the entry of ``key`` and its key, or ``None`` if it is not found
+        """
+
+        lower_key = key.lower()
+        h = _hash(lower_key.encode('utf-8'))
+        buf, mask = self._buf, self._n_slots - 1
+        i = h & mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(buf, self._table_offset + i * _SLOT.size)
+            if offset == 0: return None
+
+            if slot_hash == h:
+                key_len, _ = _ENTRY.unpack_from(buf, offset)
+                start = offset + _ENTRY.size
+                entry_key = str(buf[start:start + key_len], 'utf-8')
+                if entry_key == key or (not case_sensitive and entry_key.lower() == lower_key): return offset, entry_key
+            #end if
+
+            i = (i + 1) & mask
+        #end while
+    #end def
+
+    def _value_at(self, offset):
+        key_len, value_len = _ENTRY.unpack_from(self._buf, offset)
+        start = offset + _ENTRY.size + key_len
+
+        return self._loads(self._buf[start:start + value_len])
+    #end def
+
+    def find_key(self, lower_key):
+        """
+        :returns: the first key (in priority order) that matches ``lower_key`` case insensitively, or ``None``
+        """
+
+        found = self._find(lower_key, case_sensitive=False)
+        return None if found is None else found[1]
+    #end def
+
+    def __getitem__(self, key):
+        found = self._find(key) if isinstance(key, str) else None
+        if found is None: raise KeyError(key)
+
+        return self._value_at(found[0])
+    #end def
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __iter__(self):
+        buf = self._buf
+        offset = _HEADER.size
+        for _ in range(self._n_entries):
+            key_len, value_len = _ENTRY.unpack_from(buf, offset)
+            start = offset + _ENTRY.size
+            yield str(buf[start:start + key_len], 'utf-8')
+            offset = start + key_len + value_len
+        #end for
+    #end def
+
+    def __len__(self):
+        return self._n_entries
+
+    def close(self):
+        """Releases the underlying buffer, i.e., so that a shared memory block can be closed."""
+        self._buf.release()
+#end class
+
+
+class _YCSKeyIndex(object):
+    """The case insensitive key index of a :class:`YCSSettings`, backed by its hash index."""
+
+    __slots__ = ('settings',)
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get(self, lower_key, default=None):
+        k = self.settings.find_key(lower_key)
+        return default if k is None else k
+    #end def
+#end class
+